@@ -1,4 +1,4 @@
-SELECT url, title, last_visit_date,rev_host
+SELECT url, title, last_visit_date,rev_host, guid
     FROM moz_historyvisits 
     NATURAL JOIN moz_places 
     WHERE last_visit_date IS NOT NULL 
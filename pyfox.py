@@ -19,11 +19,30 @@ import tempfile
 import fnmatch
 import shutil
 from configparser import SafeConfigParser
+import configparser
+from collections import namedtuple
+from operator import attrgetter, itemgetter
+from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from urllib.request import pathname2url
+from urllib.parse import urlsplit
+import hashlib
+import html
+import glob
 import re
+try:
+    from re import _parser as sre_parse # 3.11+
+except ImportError:
+    import sre_parse
 
-# debugging 
+# debugging
 from pprint import pprint as pp
 
+from pyfox_sort import external_sort, SORT_BUFFER_ROWS
+from pyfox_trigram import TrigramIndex
+from pyfox_parallel import filter_pool, ordered_map, PENDING_PER_WORKER
+
 # trying to load additional url filters for history sql queries
 HISTORY_SQL_URL_FILTERS = [] # an empty sequence
 try:
@@ -63,11 +82,10 @@ def resolve_symlink( pathname, _level = 0, _maxlevel = 8 ):
 # -----------------------------------------------------------------------------------
 # constants
 
-# "dev mode" with full tracebacks
-_dbg = True # change this in production
-if _dbg:
-    import cgitb
-    cgitb.enable(format='text')
+# "dev mode" with full tracebacks and debug output ( sql, first rows, filtered rows ) ;
+# turned on for the command line only ( see __main__ ), library callers get quiet
+# generators unless they set 'pyfox._dbg = True' themselves
+_dbg = False
 
 # Firefox history database name, see
 # [ https://developer.mozilla.org/en-US/docs/Mozilla/Tech/Places/Database ]
@@ -75,29 +93,91 @@ DBNAME = 'places.sqlite'
 
 HTML_TEMPLATE_BOOKMARKS = 'template_bookmarks.html'
 HTML_TEMPLATE_HISTORY   = 'template_history.html'
+HTML_TEMPLATE_SESSIONS  = 'template_sessions.html'
 
 # moving SQL code to external files makes it easier to test with sqlite3 utility, e.g. :
 #   "echo '.read test_query.sql | sqlite3 places.sqlite"
 FF_QUERY_BOOKMARKS = 'bookmarks_query.sql'
 FF_QUERY_HISTORY   = 'history_query.sql'
+FF_QUERY_SESSIONS  = 'sessions_query.sql'
 # this can be wrapped with some function/class and invoked from __main__,
 # however, for a small utility it shall just do
 ## PROGDIR = os.path.dirname( sys.argv[0] )
-PROGDIR = os.path.dirname( resolve_symlink( sys.argv[0] ) )
+## PROGDIR = os.path.dirname( resolve_symlink( sys.argv[0] ) )
+# nb: __file__ rather than sys.argv[0], so that it also works when imported as a library
+PROGDIR = os.path.dirname( resolve_symlink( os.path.abspath( __file__ ) ) )
 ## print( f"PROGDIR: {PROGDIR!r}" )
 
-# converting to paths relative to sys.argv[0]
+# converting to paths relative to the script location
 FF_QUERY_BOOKMARKS = os.path.join( PROGDIR, FF_QUERY_BOOKMARKS )
 FF_QUERY_HISTORY   = os.path.join( PROGDIR, FF_QUERY_HISTORY )
+FF_QUERY_SESSIONS  = os.path.join( PROGDIR, FF_QUERY_SESSIONS )
 
 HTML_TEMPLATE_BOOKMARKS = os.path.join( PROGDIR, HTML_TEMPLATE_BOOKMARKS )
 HTML_TEMPLATE_HISTORY   = os.path.join( PROGDIR, HTML_TEMPLATE_HISTORY )
+HTML_TEMPLATE_SESSIONS  = os.path.join( PROGDIR, HTML_TEMPLATE_SESSIONS )
 
 # attaching js table filtering code, 
 # see [ https://github.com/sunnywalker/jQuery.FilterTable ]
 JQ_MIN_PATH = 'jquery.min.js'
 JQ_FT_PATH  = 'jquery.filtertable.min.js'
 
+# closes what html templates open
+HTML_FOOTER = "</tbody>\n</table>\n</body>\n</html>"
+
+# a template's table header, replaced to match '--columns'
+RE_HTML_THEAD = re.compile(r'<thead>.*?</thead>', re.DOTALL)
+
+# how report dates are shown
+REPORT_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# '--shard' : an index page, rows are added by write_shard_index()
+HTML_SHARD_INDEX_HEADER = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>Pyfox</title>
+</head>
+<body>
+    <h1>Pyfox</h1>
+    <table>
+        <thead>
+            <tr>
+                <th scope="col">report</th>
+                <th scope="col">rows</th>
+                <th scope="col">from</th>
+                <th scope="col">to</th>
+            </tr>
+        </thead>
+        <tbody>
+"""
+
+SHARD_MONTH = 'month'
+
+# '--sessions' : a session ends after that many minutes without visits
+SESSION_GAP_MINUTES = 30
+# visit types starting a new session unless they have a referrer : typed urls (2) and bookmarks (3), see
+# [ https://developer.mozilla.org/en-US/docs/Mozilla/Tech/Places/Database ]
+SESSION_START_VISIT_TYPES = ( 2, 3 )
+
+# '--homes' : parallel profile discovery
+DISCOVERY_WORKERS = 8
+
+# '--jobs' : rows fetched ( and handed to a filtering process ) at a time
+FILTER_BATCH_ROWS = 20000
+
+# '--connection' : how connect_places() opens databases
+CONNECTION_DEFAULT = 'default'
+CONNECTION_READ    = 'read'
+
+# read-only, scan-heavy queries : memory-mapped i/o, a bigger page cache ( negative = KiB ),
+# in-memory temporary tables for sorting, and no writes whatsoever
+READ_PRAGMAS = ( ( 'query_only', 'ON' )
+               , ( 'temp_store', 'MEMORY' )
+               , ( 'mmap_size', 256 * 1024 * 1024 )
+               , ( 'cache_size', -64 * 1024 )
+               )
+
 #
 # accessory constants
 #
@@ -107,6 +187,71 @@ RE_SQL_COMMENT_1 = re.compile(r'--.*$', re.MULTILINE)
 # strip C-like comments ( sadly would also work inside sql strings )
 RE_SQL_COMMENT_2 = re.compile(r'/[*].*?[*]/', re.DOTALL)
 
+#
+# library api result rows
+#
+
+# named tuples have no per-instance __dict__ ( __slots__ = () ) and are cheap to create
+HistoryRow  = namedtuple( 'HistoryRow',  ( 'link', 'title', 'last_visit', 'profile', 'guid' ) )
+BookmarkRow = namedtuple( 'BookmarkRow', ( 'link', 'title', 'date', 'folder', 'profile', 'guid' ) )
+# a HistoryRow with a similarity score
+FuzzyRow    = namedtuple( 'FuzzyRow', HistoryRow._fields + ( 'score', ) )
+# a '--sessions' record ; link / title are for the entry page
+SessionRow  = namedtuple( 'SessionRow', ( 'start', 'end', 'n_pages', 'link', 'title', 'profile' ) )
+# a '--shard' report file ; first/last are the earliest/latest visit dates
+ShardInfo   = namedtuple( 'ShardInfo', ( 'filename', 'n_rows', 'first', 'last' ) )
+
+# a 'host:example.org' ( the host and its subdomains ) or 'site:example.org' ( exact ) query token
+HostMatch   = namedtuple( 'HostMatch', ( 'host', 'exact' ) )
+
+#
+# fuzzy search
+#
+
+# local cache ( search indexes ), see
+# [ https://specifications.freedesktop.org/basedir-spec/latest/ ]
+CACHE_DIR = os.path.join( os.environ.get('XDG_CACHE_HOME') or os.path.join( os.path.expanduser('~'), '.cache' )
+                        , 'pyfox' )
+
+# places new or changed since the last trigram index update
+FF_QUERY_TRIGRAM_UPDATE = """
+SELECT id, guid, url, title, last_visit_date
+    FROM moz_places
+    WHERE last_visit_date IS NOT NULL
+        AND url LIKE 'http%'
+        AND ( id > {max_id} OR last_visit_date > {max_visit} ) ;
+"""
+
+# a cheap summary of moz_places : row count ( over the smallest index ), max id,
+# and the count of places above the max id seen last time ( a rowid range ) ;
+# unless places were removed, the count is the last one plus the new places
+FF_QUERY_TRIGRAM_SIGNATURE = """
+SELECT count(*), coalesce( max(id), 0 ), ( SELECT count(*) FROM moz_places WHERE id > {max_id} )
+    FROM moz_places ;
+"""
+
+# all the places that shall be in the trigram index, to drop the ones gone
+# ( and find retitled ones ) ; same conditions as above
+FF_QUERY_TRIGRAM_LIVE = """
+SELECT id, title
+    FROM moz_places
+    WHERE last_visit_date IS NOT NULL
+        AND url LIKE 'http%' ;
+"""
+
+# given places, to re-index
+FF_QUERY_TRIGRAM_PLACES = """
+SELECT id, guid, url, title, last_visit_date
+    FROM moz_places
+    WHERE id IN ( {place_ids} ) ;
+"""
+
+# place ids per FF_QUERY_TRIGRAM_PLACES query
+TRIGRAM_PLACES_CHUNK = 500
+
+FUZZY_THRESHOLD = 0.4
+FUZZY_LIMIT = 200
+
 # -----------------------------------------------------------------------------------
 
 if 0:
@@ -147,21 +292,211 @@ def history_add_sql_url_filters( stripped_sql
     return result
 
 
+def sql_quote( text ):
+    """ a single-quoted sql string literal """
+
+    return "'" + text.replace( "'", "''" ) + "'"
+
+
+def sql_like_escape( text ):
+    """ escape LIKE wildcards, to be used with "ESCAPE '\\'" """
+
+    return text.replace( '\\', '\\\\' ).replace( '%', '\\%' ).replace( '_', '\\_' )
+
+
+def sqlite_regexp( expr, item, _cache = {} ):
+    """ an implementation for sqlite 'item REGEXP expr' ( which calls regexp(expr, item) ) ;
+        each pattern is compiled once ; case-insensitive, like the '--query' matching
+    """
+
+    if item is None:
+        return False
+
+    pattern = _cache.get( expr )
+    if pattern is None:
+        pattern = re.compile( expr, re.IGNORECASE )
+        _cache[ expr ] = pattern
+
+    return pattern.search( item ) is not None
+
+
+def regex_required_literal( regex ):
+    """ the longest literal substring any match of the regex shall contain,
+        or '' if there is none ( or the regex is beyond this quick analysis ) ;
+        non-ascii literals are skipped since sqlite LIKE only folds ascii case
+    """
+
+    try:
+        parsed = sre_parse.parse( regex, re.IGNORECASE )
+    except re.error:
+        return ''
+
+    candidates = []
+
+    def _walk( items ):
+        run = []
+        for op, av in items:
+            if op is sre_parse.LITERAL:
+                run.append( chr(av) )
+                continue
+            # else ... a literal run ends here
+            candidates.append( ''.join(run) ) ; run = []
+
+            if op is sre_parse.SUBPATTERN:
+                _walk( av[-1] )
+            elif op in ( sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT ):
+                _min, _max, sub = av
+                if _min >= 1:
+                    _walk( sub )
+
+        candidates.append( ''.join(run) )
+
+    _walk( parsed )
+
+    candidates = [ c for c in candidates if c.isascii() ]
+
+    return max( candidates, key = len, default = '' )
+
+
+def regex_sql_condition( regex, url_column = 'url', title_column = 'title', regex_in_sql = True ):
+    """ "AND ..." sql text to match urls or titles against a regex via REGEXP ;
+        a required literal, if any, is checked first with a ( much cheaper ) LIKE ;
+        with 'regex_in_sql' off only that LIKE is kept, the regex is then up to the caller
+    """
+
+    # fail early, and with a clear message, for a broken regex
+    re.compile( regex )
+
+    fragments = []
+
+    literal = regex_required_literal( regex )
+    if literal:
+        like = sql_quote( '%' + sql_like_escape( literal ) + '%' )
+        _fmt = "AND ( {0} LIKE {2} ESCAPE '\\' OR {1} LIKE {2} ESCAPE '\\' )"
+        fragments.append( _fmt.format( url_column, title_column, like ) )
+
+    if regex_in_sql:
+        _fmt = "AND ( {0} REGEXP {2} OR {1} REGEXP {2} )"
+        fragments.append( _fmt.format( url_column, title_column, sql_quote( regex ) ) )
+
+    if not fragments:
+        return ''
+
+    return '\n'.join( fragments ) + '\n'
+
+
+def host_sql_condition( host_groups, rev_host_column = 'rev_host' ):
+    """ "AND ..." sql text limiting places to the hosts of query_host_groups() ;
+        moz_places.rev_host is the reversed host name with a trailing dot ( 'gro.elpmaxe.www.' )
+        and is indexed, so 'host:example.org' is a range scan over 'gro.elpmaxe.' prefixes
+        and 'site:example.org' a single key lookup
+    """
+
+    or_parts = []
+    for host_matches in host_groups:
+
+        and_parts = []
+        for host_match in host_matches:
+            rev_host = host_match.host[::-1] + '.'
+            if host_match.exact:
+                and_parts.append( "{0} = {1}".format( rev_host_column, sql_quote( rev_host ) ) )
+            else:
+                # '/' follows '.' in ascii, so that's everything starting with 'rev_host'
+                _fmt = "{0} >= {1} AND {0} < {2}"
+                and_parts.append( _fmt.format( rev_host_column, sql_quote( rev_host ), sql_quote( rev_host[:-1] + '/' ) ) )
+
+        or_parts.append( '( ' + ' AND '.join( and_parts ) + ' )' )
+
+    return "AND ( " + ' OR '.join( or_parts ) + " )\n"
+
+
+def build_history_sql( sql_filters = (), regex = None, regex_in_sql = True, host_groups = None ):
+    """ read FF_QUERY_HISTORY, append url filters and the ordering clause
+        ( see regex_sql_condition() for 'regex_in_sql', host_sql_condition() for 'host_groups' )
+    """
+
+    with open( FF_QUERY_HISTORY ) as f:
+
+        sql_code = f.read()
+        no_comments = sql_quick_strip_comments( sql_code )
+        ff_sql = no_comments.rstrip().rstrip(';')
+
+    ff_sql = history_add_sql_url_filters( ff_sql, sql_filters )
+
+    if host_groups:
+        ff_sql += host_sql_condition( host_groups )
+
+    if regex is not None:
+        ff_sql += regex_sql_condition( regex, regex_in_sql = regex_in_sql )
+
+    ff_sql += " ORDER BY last_visit_date DESC;"
+
+    return ff_sql
+
+
+def build_bookmarks_sql( regex = None, regex_in_sql = True, host_groups = None ):
+    """ read FF_QUERY_BOOKMARKS, append conditions and the ordering clause
+        ( see regex_sql_condition() for 'regex_in_sql', host_sql_condition() for 'host_groups' )
+    """
+
+    with open( FF_QUERY_BOOKMARKS ) as f:
+
+        sql_code = f.read()
+        no_comments = sql_quick_strip_comments( sql_code )
+        ff_query = no_comments.rstrip().rstrip(';') + '\n'
+
+    if host_groups:
+        ff_query += host_sql_condition( host_groups, 'p.rev_host' )
+
+    if regex is not None:
+        ff_query += regex_sql_condition( regex, 'p.url', 'p.title', regex_in_sql = regex_in_sql )
+
+    ff_query += " ORDER BY b1.dateAdded DESC;"
+
+    return ff_query
+
+
+def build_sessions_sql( sql_filters = (), start_date = None, end_date = None ):
+    """ read FF_QUERY_SESSIONS, append url filters, visit date limits
+        and the ( ascending ) ordering clause ;
+        nb: no '--regex' here, sessions are made of all the visits ( see iter_sessions() )
+    """
+
+    with open( FF_QUERY_SESSIONS ) as f:
+
+        sql_code = f.read()
+        no_comments = sql_quick_strip_comments( sql_code )
+        ff_sql = no_comments.rstrip().rstrip(';')
+
+    ff_sql = history_add_sql_url_filters( ff_sql, sql_filters )
+
+    # dates are pushed down to sqlite, where visit_date is indexed
+    if start_date is not None:
+        ff_sql += "AND v.visit_date >= {}\n".format( to_moz_time( start_date ) )
+    if end_date is not None:
+        ff_sql += "AND v.visit_date <= {}\n".format( to_moz_time( end_date ) )
+
+    ff_sql += " ORDER BY v.visit_date;"
+
+    return ff_sql
+
+
 # an external wrapper
-def run_query_wrapper( dbname, query ):
+def run_query_wrapper( dbname, query, connection = CONNECTION_DEFAULT, batch_rows = None ):
     """ a generator ; opens an sqlite database, runs a query, 
-        yields rows, closes the connection """
+        yields rows ( or lists of up to 'batch_rows' rows ), closes the connection """
 
     if _dbg:
         print( dbname )
         print( query )
 
     try:
-        for row in run_query( dbname, query ):
+        for row in run_query( dbname, query, connection, batch_rows ):
             yield row
 
     except Exception as error:
-        if _dbg:
+        # nb: library callers get the exception to handle
+        if _dbg or __name__ != "__main__":
             raise
         else:
             print(str(error) + "\n " + query)
@@ -171,7 +506,7 @@ def run_query_wrapper( dbname, query ):
 # next-level wrapper: tries to open an existing database, 
 # and reopens a temporary if that fails ;
 # calls an internal function to actually run a query )
-def run_query( dbname, query ):
+def run_query( dbname, query, connection = CONNECTION_DEFAULT, batch_rows = None ):
     """ a generator ; opens an sqlite database, runs a query, 
         yields rows, closes the connection """
 
@@ -180,7 +515,7 @@ def run_query( dbname, query ):
 
     try:
         
-        for row in run_query_internal( dbname, query ):
+        for row in run_query_internal( dbname, query, connection, batch_rows ):
             yield row
                 
     except sqlite3.OperationalError as e:
@@ -195,30 +530,83 @@ def run_query( dbname, query ):
     if reopen:
         # try to open the same as a temporary file
         # // not ideal, but shall do for home use
-        tmp = tempfile.NamedTemporaryFile(delete=False, prefix='pyfox', suffix='.sqlite')
-        tmpname = tmp.name
-        if _dbg: 
-            print( tmpname )
-        shutil.copyfile( dbname, tmpname )
-        tmp.close()
-
-        for row in run_query_internal( tmpname, query ):
-            yield row
+        tmpname = _snapshot_copy( dbname )
 
-        ## if not _dbg: 
-        if 1:
-            os.unlink( tmpname )
+        try:
+            for row in run_query_internal( tmpname, query, connection, batch_rows ):
+                yield row
+
+        finally:
+            # also when the generator is closed early ( a 'limit', a cancelled async query )
+            ## if not _dbg: 
+            if 1:
+                os.unlink( tmpname )
+
+
+
+def _snapshot_copy( dbname ):
+    """ copy a ( locked ) database to a temporary file, return the copy name ;
+        removing it is up to the caller
+    """
+
+    tmp = tempfile.NamedTemporaryFile(delete=False, prefix='pyfox', suffix='.sqlite')
+    tmpname = tmp.name
+    if _dbg: 
+        print( tmpname )
+    shutil.copyfile( dbname, tmpname )
+    tmp.close()
+
+    return tmpname
+
+
+@contextmanager
+def places_connection( dbname, connection = CONNECTION_DEFAULT ):
+    """ an open connection ( see connect_places() ) for several queries in a row ;
+        a locked database is copied to a temporary file once, as run_query() would do
+        for each query, and the copy is removed afterwards
+    """
+
+    tmpname = None
+    conn = connect_places( dbname, connection )
+    try:
+        # a locked database fails on the first read
+        conn.execute( "SELECT count(*) FROM sqlite_master" ).fetchone()
+
+    except sqlite3.OperationalError as e:
+        conn.close()
+        if 'database is locked' not in e.args :
+            raise
+        tmpname = _snapshot_copy( dbname )
+        conn = connect_places( tmpname, connection )
 
+    try:
+        yield conn
+    finally:
+        conn.close()
+        if tmpname is not None:
+            os.unlink( tmpname )
 
 
 # implementation ; may reopne a copy for a locked database file
-def run_query_internal( dbname, query, _print_max = 30 ):
+def run_query_internal( dbname, query, connection = CONNECTION_DEFAULT, batch_rows = None, _print_max = 30 ):
     """ a generator ; opens an sqlite database, runs a query, 
-        yields rows, closes the connection """
+        yields rows, closes the connection ;
+        yields lists of up to 'batch_rows' rows ( cursor.fetchmany() ) if that is given """
+
+    with closing( connect_places( dbname, connection ) ) as conn:
 
-    with sqlite3.connect(dbname) as conn:
-    
         c = conn.cursor()
+
+        if batch_rows is not None:
+            c.execute( query )
+            while True:
+                batch = c.fetchmany( batch_rows )
+                if not batch:
+                    break
+                yield batch
+            return
+
+        # else ...
         for n, row in enumerate(c.execute( query )):
 
             if _dbg:
@@ -230,6 +618,105 @@ def run_query_internal( dbname, query, _print_max = 30 ):
             yield row
 
 
+def connect_places( dbname, connection = CONNECTION_DEFAULT ):
+    """ open an sqlite connection for pyfox queries
+
+        args:
+         - connection -- CONNECTION_DEFAULT for a plain sqlite3.connect(),
+                         CONNECTION_READ for a read-only one tuned for scans ( see READ_PRAGMAS )
+    """
+
+    # a query generator may be resumed by different threads ( see 'pyfox_async.py' ),
+    # though never by two at once
+    if connection == CONNECTION_READ:
+        uri = 'file:{}?mode=ro'.format( pathname2url( os.path.abspath( dbname ) ) )
+        conn = sqlite3.connect( uri, uri = True, check_same_thread = False )
+        for pragma, value in READ_PRAGMAS:
+            conn.execute( 'PRAGMA {} = {}'.format( pragma, value ) )
+    else:
+        conn = sqlite3.connect( dbname, check_same_thread = False )
+
+    # for '--regex' ; matching runs inside the query scan
+    conn.create_function( 'REGEXP', 2, sqlite_regexp, deterministic = True )
+
+    return conn
+
+
+def explain_query( dbname, query, connection = CONNECTION_DEFAULT ):
+    """ 'EXPLAIN QUERY PLAN' rows : ( id, parent, notused, detail ) """
+
+    with closing( connect_places( dbname, connection ) ) as conn:
+        result = conn.execute( 'EXPLAIN QUERY PLAN ' + query ).fetchall()
+
+    return result
+
+
+def format_query_plan( plan_rows ):
+    """ indent query plan steps as a tree, and flag the usually expensive ones :
+        every SCAN -- of a table, or of a whole index ( '... USING [COVERING] INDEX' ),
+        which still visits each row -- and temporary b-trees for sorting / grouping ;
+        only SEARCH steps ( index lookups ) are left as they are
+    """
+
+    depth = {}
+    lines = []
+    for node_id, parent, _notused, detail in plan_rows:
+
+        depth[ node_id ] = depth.get( parent, -1 ) + 1
+        text = '  ' * depth[ node_id ] + detail
+
+        flag = ''
+        if detail.startswith('SCAN ') and 'INDEX' in detail:
+            flag = '<- full index scan'
+        elif detail.startswith('SCAN '):
+            flag = '<- full scan'
+        elif 'TEMP B-TREE' in detail:
+            flag = '<- temp b-tree sort'
+
+        if flag:
+            text = '{0:<60} {1}'.format( text, flag )
+
+        lines.append( text )
+
+    return '\n'.join( lines )
+
+
+def explain(dbnames, options, sql_filters):
+    ''' print query plans for the sql that '--history' / '--bookmarks' / '--sessions' would run '''
+
+    # '--jobs' moves regex matching out of sqlite
+    regex_in_sql = not _use_filter_pool( options.jobs )
+
+    parsed_query, _parsed_filter = _parse_filters( options.query )
+    host_groups = query_host_groups( parsed_query )
+
+    queries = []
+    if options.history is not None:
+        queries.append( ( 'history', build_history_sql( sql_filters
+                                                      , regex = options.regex
+                                                      , regex_in_sql = regex_in_sql
+                                                      , host_groups = host_groups
+                                                      ) ) )
+    if options.bookmarks is not None:
+        queries.append( ( 'bookmarks', build_bookmarks_sql( regex = options.regex
+                                                          , regex_in_sql = regex_in_sql
+                                                          , host_groups = host_groups
+                                                          ) ) )
+    if options.sessions is not None:
+        start_date, end_date = ( None, None )
+        if options.date_cond is not None:
+            start_date, end_date = _parse_date_spec( options.date_cond )
+        queries.append( ( 'sessions', build_sessions_sql( sql_filters, start_date, end_date ) ) )
+
+    for dbname in dbnames:
+        for name, query in queries:
+
+            print( "-- {0}: {1} ( connection: {2} )".format( name, dbname, options.connection ) )
+            print( query.strip() )
+            print()
+            print( format_query_plan( explain_query( dbname, query, options.connection ) ) )
+            print()
+
 
 def open_browser(url):
     '''Opens the default browswer'''
@@ -327,6 +814,12 @@ def convert_moz_time( moz_time_entry ):
     return result
 
 
+def to_moz_time( some_date ):
+    """ the reverse of convert_moz_time() : a datetime to microseconds since the epoch """
+
+    return int( some_date.timestamp() * 1000000 )
+
+
 def copy_js_files( pathname ):
     """
         copy accessory javascript files to the given location if they are missing
@@ -351,12 +844,28 @@ def make_temp_filename( query_type = 'bookmarks' ):
 
     if query_type == 'bookmarks' :
         result = os.path.join( tmpdir, 'pyfox-bookmarks.html' )
+    elif query_type == 'sessions' :
+        result = os.path.join( tmpdir, 'pyfox-sessions.html' )
     else: # assume a 'history' query
         result = os.path.join( tmpdir, 'pyfox-history.html' )
 
     return result
 
 
+def _report_filename( options, query_type ):
+    """ '--output-file' if set, make_temp_filename() otherwise ;
+        makes sure js files are there
+    """
+
+    if options.output_filename is None:
+        filename = make_temp_filename( query_type )
+    else:
+        filename = options.output_filename
+        copy_js_files( os.path.dirname( filename ) )
+
+    return filename
+
+
 def _pass_filters( title, link
                  , parsed_query, parsed_filter
                  , _n_lines_max = 20
@@ -378,8 +887,9 @@ def _pass_filters( title, link
 
     query_matched = True # passed by default
     if parsed_query:
-        _link_matched  = fnmatch_pass( link, parsed_query )
-        _title_matched = fnmatch_pass( title, parsed_query )
+        # nb: 'host:' / 'site:' tokens apply to the link whatever text is matched
+        _link_matched  = fnmatch_pass( link, parsed_query, link )
+        _title_matched = fnmatch_pass( title, parsed_query, link )
         
         query_matched = _link_matched or _title_matched
 
@@ -393,8 +903,8 @@ def _pass_filters( title, link
 
     query_filtered = False # passed by default
     if parsed_filter:
-        _link_filtered  = fnmatch_pass( link, parsed_filter )
-        _title_filtered = fnmatch_pass( title, parsed_filter )
+        _link_filtered  = fnmatch_pass( link, parsed_filter, link )
+        _title_filtered = fnmatch_pass( title, parsed_filter, link )
         
         query_filtered = _link_filtered or _title_filtered
 
@@ -410,218 +920,962 @@ def _pass_filters( title, link
     return True
 
 
-## def history(cursor, pattern=None, src=""):
-## def history(dbname, pattern=None, src=""):
-## def history(dbname, options, src="" ):
-## def history(dbnames, options, profiles={}, src="", _max_dbg_lines = 20 ):
-def history(dbnames, options, sql_filters, profiles={}, src="", _max_dbg_lines = 20 ):
-    ''' Function which extracts history from the sqlite file '''
-
-    with open( HTML_TEMPLATE_HISTORY, 'r') as t:
-        html_chunks = [ t.read() ]
+def _parse_filters( query = None, filter = None ):
+    """ parse_query() both expressions, keeping None for the missing ones """
 
     parsed_query = None
-    if options.query is not None:
-        parsed_query = parse_query( options.query )
+    if query is not None:
+        parsed_query = parse_query( query )
     parsed_filter = None
-    if options.filter is not None:
-        parsed_filter = parse_query( options.filter )
+    if filter is not None:
+        parsed_filter = parse_query( filter )
 
-    date_cond = None ;  start_date, end_date = ( None, None )
-    if options.date_cond is not None:
-        start_date, end_date = _parse_date_spec( options.date_cond )
-        date_cond = ( start_date, end_date )
+    return ( parsed_query, parsed_filter )
 
-    if src == 'firefox':
 
-        with open( FF_QUERY_HISTORY ) as f:
+def dedupe_key( *parts ):
+    """ a 64-bit hash of a record identity ( e.g. moz_places.guid ) ;
+        keeps a "seen" set small when streaming through many databases
+    """
 
-            sql_code = f.read()
-            no_comments = sql_quick_strip_comments( sql_code )
-            ff_sql = no_comments.rstrip().rstrip(';')
+    h = hashlib.blake2b( digest_size = 8 )
+    h.update( '\x1f'.join( str(p) for p in parts ).encode('utf8') )
 
-        # '--history' loses an optional "pattern" argument --
-        #  -- use '--query' and '--filter' options instead
-        if 0:
-            pattern = options.history
-            ## if options.pattern is not None:
-            if pattern is not None:
-                ff_sql += " AND url LIKE '%"+pattern+"%' "
+    return int.from_bytes( h.digest(), 'little' )
 
-        ff_sql = history_add_sql_url_filters( ff_sql, sql_filters )
 
-        ff_sql += " ORDER BY last_visit_date DESC;"
+# '--jobs' : filters of a worker process, see _init_filter_worker()
+_worker_filters = None
 
-        for dbname in dbnames:
 
-            profile_name = get_profile_name( dbname, profiles )
+def _init_filter_worker( parsed_query, parsed_filter, regex = None, start_date = None, end_date = None ):
+    """ a filtering process initializer ; keeps the filters for _filter_batch() """
 
-            _n_dbg = 0
-            for row in run_query_wrapper( dbname, ff_sql ):
+    global _worker_filters
+    _worker_filters = ( parsed_query, parsed_filter, regex, start_date, end_date )
 
-                last_visit = convert_moz_time( row[2] )
 
-                link = row[0]
-                show_link = link[:100]
-                title = row[1][:100]
+def _filter_batch( batch ):
+    """ rows of a fetched batch, ( link, title, moz date, ... ) each,
+        passing the filters given to _init_filter_worker() ; runs in worker processes
+    """
 
+    parsed_query, parsed_filter, regex, start_date, end_date = _worker_filters
+    check_dates = ( start_date is not None ) or ( end_date is not None )
 
-                if not _pass_filters( title = title
-                                    , link = link
-                                    , parsed_query = parsed_query
-                                    , parsed_filter = parsed_filter
-                                    , _n_lines_max = _max_dbg_lines
-                                    ):
-                    # no match or filtered by the filter expression --
-                    # -- skip this one
-                    continue
+    result = []
+    for row in batch:
 
-                if date_cond is not None:
-                    if not _date_within( last_visit, start_date, end_date ):
-                        if _dbg:
-                            if _n_dbg < _max_dbg_lines:
-                                _n_dbg += 1
-                                print (f"# > {show_link!r} filtered by date: !({start_date} < {last_visit} < {end_date})"
-                                      , file = sys.stderr )
-                        continue
+        link = row[0]
+        title = row[1]
 
-                last_visit = last_visit.strftime('%Y-%m-%d %H:%M:%S')
+        if not _pass_filters( title = title
+                            , link = link
+                            , parsed_query = parsed_query
+                            , parsed_filter = parsed_filter
+                            ):
+            continue
 
-                # else ...
+        if regex is not None:
+            if not ( sqlite_regexp( regex, link ) or sqlite_regexp( regex, title ) ):
+                continue
 
-                _parts = [ "<tr>"
-                         , "<td><a href='{link}'>{title}</a></td>"
-                         , "<td>{last_visit}</td>"
-                         , "<td>{show_link}</td>"
-                         , "<td>{profile_name}</td>"
-                         , "</tr>\n" 
-                         ]
+        if check_dates:
+            if not _date_within( convert_moz_time( row[2] ), start_date, end_date ):
+                continue
 
-                ## trow = "<tr><td><a href='{link}'>{title}</a></td><td>{last_visit}</td><td>{show_link}</td></tr>\n".format( **locals() )
-                trow = ''.join(_parts).format( **locals() )
-                html_chunks.append( trow )
+        result.append( row )
 
+    return result
 
-    # turning off chrome 'branch' -- anyone interested feel free to reopen it and handle like FF code above )
-    if 0:
-        if src == 'chrome':
-            sql = "SELECT urls.url, urls.title, urls.visit_count, \
-            urls.typed_count, datetime(urls.last_visit_time/1000000-11644473600,'unixepoch','localtime'), urls.hidden,\
-            visits.visit_time, visits.from_visit, visits.transition FROM urls, visits\
-             WHERE  urls.id = visits.url and urls.title is not null order by last_visit_time desc "
 
-            execute_query(cursor, sql)
-            for row in cursor:
-                print("%s %s"%(row[0], row[4]))
+def _use_filter_pool( jobs ):
+    """ whether '--jobs' asks for filtering on a process pool """
 
+    return jobs is not None and jobs > 1
 
-    html_chunks.append( "</tbody>\n</table>\n</body>\n</html>" )
-    html = ''.join( html_chunks )
-    
-    if options.output_filename is None:
-        filename = make_temp_filename( 'history' )
-    else:
-        filename = options.output_filename
-        copy_js_files( os.path.dirname( filename ) )
-        
-    html_file = open( filename, 'w' )
 
-    html_file.write(html)
-    html_file.close()
-    
-    open_browser( filename )
+def _pool_filtered_rows( pool, jobs, dbname, query, connection = CONNECTION_DEFAULT, batch_rows = FILTER_BATCH_ROWS ):
+    """ a generator ; rows of a query that pass the filters the pool was set up with
+        ( see _init_filter_worker() ) -- fetched in batches, filtered by 'jobs' processes,
+        and yielded in the query order
+    """
 
+    batches = run_query_wrapper( dbname, query, connection, batch_rows = batch_rows )
+
+    for passed in ordered_map( pool, _filter_batch, batches, PENDING_PER_WORKER * jobs ):
+        yield from passed
+
+
+def iter_history( dbnames
+                , query = None
+                , filter = None
+                , dates = None
+                , limit = None
+                , sql_filters = ()
+                , profiles = {}
+                , dedupe = False
+                , regex = None
+                , connection = CONNECTION_DEFAULT
+                , jobs = None
+                , _max_dbg_lines = 20
+                ):
+    """ a generator ; yields HistoryRow-s for the given 'places.sqlite' files
+
+        args:
+         - dbnames -- a list of 'places.sqlite' paths
+         - query, filter -- expressions as accepted by parse_query() ( see '--query' / '--filter' )
+         - dates -- a date spec as accepted by _parse_date_spec(), e.g. '2020-02-02..2020-02-20'
+         - limit -- stop after that many rows ( for all the databases together )
+         - sql_filters -- "permanent" url filters, already wrapped by sql_like_decorate()
+         - profiles -- a dict as returned by list_profiles()
+         - dedupe -- emit each place ( by moz_places.guid ) only once for all the databases,
+                     e.g. a live profile and its backups ; the first one seen wins
+         - regex -- a regular expression for urls or titles ( case-insensitive ),
+                    evaluated by sqlite itself
+         - connection -- see connect_places()
+         - jobs -- filter rows on that many processes ( for --query, --filter, --dates and --regex ),
+                   fetching them in batches ; the order of rows is kept
+    """
 
-## def bookmarks(cursor, pattern=None):
-## def bookmarks(dbname, pattern=None, _max_dbg_lines = 20):
-def bookmarks(dbnames, options, profiles={}, _max_dbg_lines = 20):
-    ''' Function to extract bookmark related information '''
+    parsed_query, parsed_filter = _parse_filters( query, filter )
 
-    with open( FF_QUERY_BOOKMARKS ) as f:
-        ff_query = f.read()
+    seen = set() if dedupe else None
 
-    parsed_query = None
-    if options.query is not None:
-        parsed_query = parse_query( options.query )
-    parsed_filter = None
-    if options.filter is not None:
-        parsed_filter = parse_query( options.filter )
+    date_cond = None ;  start_date, end_date = ( None, None )
+    if dates is not None:
+        start_date, end_date = _parse_date_spec( dates )
+        date_cond = ( start_date, end_date )
 
-    with open( HTML_TEMPLATE_BOOKMARKS, 'r') as t:
-        ## html = t.read()
-        html_chunks = [ t.read() ]
+    if limit is not None and limit <= 0:
+        return
 
-    if options.output_filename is None:
-        filename = make_temp_filename( 'bookmarks' )
-    else:
-        filename = options.output_filename
-        copy_js_files( os.path.dirname( filename ) )
-    
-    html_file = open( filename, 'wb' )
+    pool = None
+    if _use_filter_pool( jobs ) and ( parsed_query or parsed_filter or date_cond or regex ):
+        pool = filter_pool( jobs, _init_filter_worker, ( parsed_query, parsed_filter, regex, start_date, end_date ) )
 
-    for dbname in dbnames:
-        
-        profile_name = get_profile_name( dbname, profiles )
-        if _dbg:
-            print( f"profile: {profile_name!r}" )
+    # with a pool, workers match the regex ( sqlite would do it on a single core ) ;
+    # 'host:' / 'site:' query tokens become index lookups ( and are checked again along with the rest )
+    ff_sql = build_history_sql( sql_filters
+                              , regex = regex
+                              , regex_in_sql = pool is None
+                              , host_groups = query_host_groups( parsed_query )
+                              )
 
-        for n, row in enumerate(run_query_wrapper( dbname, ff_query )):
+    try:
+        n_rows = 0
+        for dbname in dbnames:
 
-            link = row[0]
-            show_link = link[:100]
-            title = row[1]
+            profile_name = get_profile_name( dbname, profiles )
 
-            if not _pass_filters( title = title
-                                , link = link
-                                , parsed_query = parsed_query
-                                , parsed_filter = parsed_filter
-                                , _n_lines_max = _max_dbg_lines
-                                ):
-                # no match or filtered by the filter expression --
-                # -- skip this one
-                continue
+            if pool is None:
+                rows = run_query_wrapper( dbname, ff_sql, connection )
+            else:
+                rows = _pool_filtered_rows( pool, jobs, dbname, ff_sql, connection )
 
-            # else ...
+            _n_dbg = 0
+            for row in rows:
 
-            date = convert_moz_time( row[2] ) # datetime object
-            date = date.strftime('%Y-%m-%d %H:%M:%S') # a string
+                link = row[0]
+                title = row[1]
+
+                # ( pool workers have checked query, filter and dates already )
+                if pool is None:
+                    if not _pass_filters( title = title
+                                        , link = link
+                                        , parsed_query = parsed_query
+                                        , parsed_filter = parsed_filter
+                                        , _n_lines_max = _max_dbg_lines
+                                        ):
+                        # no match or filtered by the filter expression --
+                        # -- skip this one
+                        continue
 
-            folder = row[3]
+                last_visit = convert_moz_time( row[2] )
 
-            _parts = [ "<tr>"
-                     , "<td><a href='{link}'>{title}</a></td>"
-                     , "<td>{date}</td>"
-                     , "<td>{folder}</td>"
-                     , "<td>{show_link}</td>"
-                     , "<td>{profile_name}</td>"
-                     , "</tr>\n"
-                     ]
-            ## html += "<tr><td><a href='{link}'>{title}</a></td><td>{date}</td><td>{folder}</td><td>{show_link}</td></tr>\n".format( **locals() )
-            line = ''.join(_parts).format( **locals() )
-            html_chunks.append( line )
+                if pool is None and date_cond is not None:
+                    if not _date_within( last_visit, start_date, end_date ):
+                        if _dbg:
+                            if _n_dbg < _max_dbg_lines:
+                                _n_dbg += 1
+                                print (f"# > {link[:100]!r} filtered by date: !({start_date} < {last_visit} < {end_date})"
+                                      , file = sys.stderr )
+                        continue
 
-            if n < _max_dbg_lines:
-                print( "%s %s" % (link, title) )
+                # else ...
 
-    html_chunks.append( "</tbody>\n</table>\n</body>\n</html>" )
+                guid = row[4]
+                if seen is not None:
+                    # older databases may lack guid-s, fall back to urls then
+                    key = dedupe_key( guid or link )
+                    if key in seen:
+                        continue
+                    seen.add( key )
+
+                yield HistoryRow( link, title, last_visit, profile_name, guid )
+
+                n_rows += 1
+                if limit is not None and n_rows >= limit:
+                    return
+
+    finally:
+        if pool is not None:
+            pool.shutdown( cancel_futures = True )
+
+
+def iter_bookmarks( dbnames
+                  , query = None
+                  , filter = None
+                  , limit = None
+                  , profiles = {}
+                  , dedupe = False
+                  , regex = None
+                  , connection = CONNECTION_DEFAULT
+                  , jobs = None
+                  , _max_dbg_lines = 20
+                  ):
+    """ a generator ; yields BookmarkRow-s for the given 'places.sqlite' files ;
+        see iter_history() for the arguments ( a bookmark is identified
+        by its place guid and the folder name when deduplicating )
+    """
 
-    html = ''.join( html_chunks )
+    parsed_query, parsed_filter = _parse_filters( query, filter )
 
-    # TODO: handle possible encoding issues if bookmarks aren't in utf-8 
-    #       ( could they be? what the docs say? )
-    #       // possibly use locale.getpreferredencoding()
-    #       // sys.getfilesystemencoding() could be a second guess, I suppose
-    html_file.write(html.encode('utf8'))
-    if 0:
-        try:
-            html_file.write(html.encode('utf8'))
-        except:
-            if not _dbg:
-                html_file.write(html)
+    seen = set() if dedupe else None
+
+    if limit is not None and limit <= 0:
+        return
+
+    pool = None
+    if _use_filter_pool( jobs ) and ( parsed_query or parsed_filter or regex ):
+        pool = filter_pool( jobs, _init_filter_worker, ( parsed_query, parsed_filter, regex ) )
+
+    ff_query = build_bookmarks_sql( regex = regex
+                                  , regex_in_sql = pool is None
+                                  , host_groups = query_host_groups( parsed_query )
+                                  )
+
+    try:
+        n_rows = 0
+        for dbname in dbnames:
+
+            profile_name = get_profile_name( dbname, profiles )
+            if _dbg:
+                print( f"profile: {profile_name!r}" )
+
+            if pool is None:
+                rows = run_query_wrapper( dbname, ff_query, connection )
             else:
-                raise
+                rows = _pool_filtered_rows( pool, jobs, dbname, ff_query, connection )
+
+            for n, row in enumerate(rows):
+
+                link = row[0]
+                title = row[1]
+
+                # ( pool workers have checked query and filter already )
+                if pool is None:
+                    if not _pass_filters( title = title
+                                        , link = link
+                                        , parsed_query = parsed_query
+                                        , parsed_filter = parsed_filter
+                                        , _n_lines_max = _max_dbg_lines
+                                        ):
+                        # no match or filtered by the filter expression --
+                        # -- skip this one
+                        continue
+
+                # else ...
+
+                date = convert_moz_time( row[2] ) # datetime object
+                folder = row[3]
+
+                guid = row[4]
+                if seen is not None:
+                    key = dedupe_key( guid or link, folder )
+                    if key in seen:
+                        continue
+                    seen.add( key )
+
+                if _dbg and n < _max_dbg_lines:
+                    print( "%s %s" % (link, title) )
+
+                yield BookmarkRow( link, title, date, folder, profile_name, guid )
+
+                n_rows += 1
+                if limit is not None and n_rows >= limit:
+                    return
+
+    finally:
+        if pool is not None:
+            pool.shutdown( cancel_futures = True )
+
+
+def trigram_index_path( dbname ):
+    """ where the trigram index for a given 'places.sqlite' lives ( under CACHE_DIR ) """
+
+    _key = hashlib.blake2b( os.path.realpath( dbname ).encode('utf8'), digest_size = 8 ).hexdigest()
+
+    return os.path.join( CACHE_DIR, 'trigrams-{}.sqlite'.format( _key ) )
+
+
+def update_trigram_index( dbname, resync = False, connection = CONNECTION_DEFAULT ):
+    """ bring the trigram index for 'dbname' up to date ; returns the index path
+
+        new and revisited places are added incrementally ; places removed from the history
+        ( e.g. cleared in firefox ) are noticed by the row count ( see FF_QUERY_TRIGRAM_SIGNATURE )
+        and only then dropped with a full sync -- or always with 'resync',
+        which also re-indexes places with a title edited without a new visit
+    """
+
+    os.makedirs( CACHE_DIR, exist_ok = True )
+
+    index_path = trigram_index_path( dbname )
+    with TrigramIndex( index_path ) as index, places_connection( dbname, connection ) as conn:
+
+        n_rows = 0
+
+        max_id, max_visit = index.high_water()
+        first_build = ( max_id, max_visit ) == ( 0, 0 )
+
+        # ( count, max id ) the last time the index was known to hold no removed places
+        synced = index.synced_signature()
+        _sql = FF_QUERY_TRIGRAM_SIGNATURE.format( max_id = int( synced[1] if synced else 0 ) )
+        count, last_id, n_above = conn.execute( _sql ).fetchone()
+
+        _sql = FF_QUERY_TRIGRAM_UPDATE.format( max_id = int(max_id), max_visit = int(max_visit) )
+        n_rows += index.update( conn.execute( _sql ) )
+
+        # nb: a first build has just added everything there is
+        removed = ( synced is None ) or ( count != synced[0] + n_above )
+        if resync or ( removed and not first_build ):
+
+            retitled = index.sync( conn.execute( FF_QUERY_TRIGRAM_LIVE ) )
+
+            for i in range( 0, len(retitled), TRIGRAM_PLACES_CHUNK ):
+                _ids = ','.join( str( int(place_id) ) for place_id in retitled[ i : i + TRIGRAM_PLACES_CHUNK ] )
+                n_rows += index.update( conn.execute( FF_QUERY_TRIGRAM_PLACES.format( place_ids = _ids ) ) )
+
+        index.set_synced_signature( ( count, last_id ) )
+
+        if _dbg:
+            print( f"trigram index {index_path!r}: {n_rows} new or changed places" )
+
+    return index_path
+
+
+def iter_fuzzy( dbnames
+              , text
+              , threshold = FUZZY_THRESHOLD
+              , limit = FUZZY_LIMIT
+              , profiles = {}
+              , resync = False
+              , connection = CONNECTION_DEFAULT
+              ):
+    """ a generator ; yields up to 'limit' FuzzyRow-s for places with titles / urls
+        similar to 'text', best first ( see pyfox_trigram )
+
+        trigram indexes are built or updated incrementally on the way
+        ( see update_trigram_index() for 'resync' )
+    """
+
+    matches = []
+    for dbname in dbnames:
+
+        profile_name = get_profile_name( dbname, profiles )
+
+        with TrigramIndex( update_trigram_index( dbname, resync, connection ) ) as index:
+            for score, url, title, last_visit_date, guid in index.search( text, threshold, limit ):
+                matches.append( FuzzyRow( url, title or '', convert_moz_time( last_visit_date )
+                                        , profile_name, guid, score ) )
+
+    matches.sort( key = attrgetter('score'), reverse = True )
+
+    yield from matches[:limit]
+
+
+def fuzzy(dbnames, options, profiles={}):
+    ''' a history report for places matching '--fuzzy' text, best first '''
+
+    render, thead = compile_row_renderer( FUZZY_COLUMNS, options.columns or HISTORY_DEFAULT_COLUMNS + ( 'score', ) )
+    html_header = _report_header( HTML_TEMPLATE_HISTORY, thead )
+
+    filename = _report_filename( options, 'history' )
+
+    html_file = open( filename, 'w', encoding='utf8' )
+    html_file.write( html_header )
+
+    rows = iter_fuzzy( dbnames
+                     , options.fuzzy
+                     , threshold = options.fuzzy_threshold
+                     , limit = options.fuzzy_limit
+                     , profiles = profiles
+                     , resync = options.fuzzy_resync
+                     , connection = options.connection
+                     )
+    _write_rows( html_file, rows, render )
+
+    html_file.write( HTML_FOOTER )
     html_file.close()
-    
+
+    open_browser( filename )
+
+
+def _text_cell( field, width = None ):
+    """ a cell value function : an html-escaped row field, optionally cut to 'width' characters """
+
+    _get = attrgetter( field )
+    _escape = html.escape
+
+    if width is None:
+        return lambda row: _escape( _get( row ) or '' )
+    # else ...
+    return lambda row: _escape( ( _get( row ) or '' )[:width] )
+
+
+def _date_cell( field ):
+    """ a cell value function : a datetime row field as REPORT_DATE_FORMAT """
+
+    _get = attrgetter( field )
+
+    return lambda row: _get( row ).strftime( REPORT_DATE_FORMAT )
+
+
+def _str_cell( field ):
+    """ a cell value function : str() of a row field ( numbers and such, nothing to escape ) """
+
+    _get = attrgetter( field )
+
+    return lambda row: str( _get( row ) )
+
+
+# report columns : name -> ( header, cell html with a '{}' per value, value functions ) ;
+# values are escaped by the value functions, cut before escaping so that no entity is split
+HISTORY_COLUMNS = { 'link'    : ( 'link', "<a href='{}'>{}</a>", ( _text_cell('link'), _text_cell('title', 100) ) )
+                  , 'date'    : ( 'date', "{}", ( _date_cell('last_visit'), ) )
+                  , 'url'     : ( 'url', "{}", ( _text_cell('link', 100), ) )
+                  , 'title'   : ( 'title', "{}", ( _text_cell('title'), ) )
+                  , 'profile' : ( 'profile', "{}", ( _text_cell('profile'), ) )
+                  , 'guid'    : ( 'guid', "{}", ( _text_cell('guid'), ) )
+                  }
+HISTORY_DEFAULT_COLUMNS = ( 'link', 'date', 'url', 'profile' )
+
+FUZZY_COLUMNS = dict( HISTORY_COLUMNS
+                    , score = ( 'score', "{}", ( lambda row: '{:.2f}'.format( row.score ), ) )
+                    )
+
+BOOKMARK_COLUMNS = { 'link'    : ( 'link', "<a href='{}'>{}</a>", ( _text_cell('link'), _text_cell('title') ) )
+                   , 'date'    : ( 'date', "{}", ( _date_cell('date'), ) )
+                   , 'folder'  : ( 'folder', "{}", ( _text_cell('folder'), ) )
+                   , 'url'     : ( 'url', "{}", ( _text_cell('link', 100), ) )
+                   , 'title'   : ( 'title', "{}", ( _text_cell('title'), ) )
+                   , 'profile' : ( 'profile', "{}", ( _text_cell('profile'), ) )
+                   , 'guid'    : ( 'guid', "{}", ( _text_cell('guid'), ) )
+                   }
+BOOKMARK_DEFAULT_COLUMNS = ( 'link', 'date', 'folder', 'url', 'profile' )
+
+SESSION_COLUMNS = { 'link'     : ( 'entry page', "<a href='{}'>{}</a>", ( _text_cell('link'), _text_cell('title', 100) ) )
+                  , 'start'    : ( 'start', "{}", ( _date_cell('start'), ) )
+                  , 'end'      : ( 'end', "{}", ( _date_cell('end'), ) )
+                  , 'duration' : ( 'duration', "{}", ( lambda row: str( row.end - row.start ), ) )
+                  , 'pages'    : ( 'pages', "{}", ( _str_cell('n_pages'), ) )
+                  , 'url'      : ( 'url', "{}", ( _text_cell('link', 100), ) )
+                  , 'profile'  : ( 'profile', "{}", ( _text_cell('profile'), ) )
+                  }
+SESSION_DEFAULT_COLUMNS = ( 'link', 'start', 'end', 'duration', 'pages', 'profile' )
+
+
+def compile_row_renderer( report_columns, columns ):
+    """ returns ( render, thead ) for the given column names ( see HISTORY_COLUMNS and others ) :
+        render( row ) makes an html table row out of a result row, thead is the matching table header ;
+
+        the row format string is put together once per report, so that
+        a row costs one str.format() call with positional values
+    """
+
+    unknown = [ name for name in columns if name not in report_columns ]
+    if unknown:
+        _msg = "unknown column(s) {}, expected some of: {}".format( ', '.join( map( repr, unknown ) )
+                                                                 , ', '.join( report_columns ) )
+        raise ValueError( _msg )
+
+    # else ...
+
+    cells = [ report_columns[ name ] for name in columns ]
+
+    _format = ( "<tr>" + ''.join( "<td>" + cell + "</td>" for _header, cell, _values in cells ) + "</tr>\n" ).format
+    value_funcs = tuple( f for _header, _cell, values in cells for f in values )
+
+    def render( row ):
+        return _format( *[ f( row ) for f in value_funcs ] )
+
+    _th = '\n'.join( '                <th scope="col">{}</th>'.format( html.escape( header ) )
+                     for header, _cell, _values in cells )
+    thead = "<thead>\n            <tr>\n{}\n            </tr>\n        </thead>".format( _th )
+
+    return ( render, thead )
+
+
+def _columns_spec( value ):
+    """ argparse type for '--columns' : comma-separated column names
+        ( checked against the selected reports by _check_columns() )
+    """
+
+    result = tuple( name.strip() for name in value.split(',') if name.strip() )
+
+    if not result:
+        raise argparse.ArgumentTypeError( "expected comma-separated column names, got {!r}".format( value ) )
+
+    return result
+
+
+def _check_columns( options ):
+    """ an error message if '--columns' doesn't fit one of the selected reports, else None """
+
+    if options.columns is None:
+        return None
+
+    # else ...
+
+    reports = [ ( '--history', options.history, HISTORY_COLUMNS )
+              , ( '--bookmarks', options.bookmarks, BOOKMARK_COLUMNS )
+              , ( '--sessions', options.sessions, SESSION_COLUMNS )
+              , ( '--fuzzy', options.fuzzy, FUZZY_COLUMNS )
+              ]
+
+    for report_option, selected, report_columns in reports:
+        if selected is None:
+            continue
+        unknown = [ name for name in options.columns if name not in report_columns ]
+        if unknown:
+            return "argument --columns: unknown column(s) {} for {}, expected some of: {}".format(
+                        ', '.join( map( repr, unknown ) ), report_option, ', '.join( report_columns ) )
+
+    return None
+
+
+def _report_header( template_path, thead ):
+    """ an html template up to the table body, with the table header replaced by 'thead' """
+
+    with open( template_path, 'r') as t:
+        html_header = t.read()
+
+    # a function, so that nothing in 'thead' is taken for a backreference
+    return RE_HTML_THEAD.sub( lambda _match: thead, html_header, count = 1 )
+
+
+def _write_rows( html_file, rows, render ):
+    """ write rows as html table rows, see compile_row_renderer() """
+
+    _write = html_file.write
+
+    for row in rows:
+        _write( render( row ) )
+
+
+def _shard_spec( value ):
+    """ argparse type for '--shard' : 'month' or a positive row count """
+
+    if value == SHARD_MONTH:
+        return value
+
+    try:
+        result = int( value )
+    except ValueError:
+        result = 0
+
+    if result < 1:
+        raise argparse.ArgumentTypeError( "expected {!r} or a positive number of rows, got {!r}".format( SHARD_MONTH, value ) )
+
+    return result
+
+
+def _regex_spec( value ):
+    """ argparse type for '--regex' : a valid python regular expression, kept as text """
+
+    try:
+        re.compile( value, re.IGNORECASE )
+    except re.error as e:
+        raise argparse.ArgumentTypeError( "bad regular expression {!r}: {}".format( value, e ) )
+
+    return value
+
+
+def write_history_shards( filename, html_header, rows, shard = SHARD_MONTH, render = None ):
+    """ write HistoryRow-s to a number of report files next to 'filename'
+        ( 'pyfox-history.html' -> 'pyfox-history-2020-02.html', ... ) --
+        -- a new one each time the stream passes a month boundary ( shard == 'month' ),
+        or every 'shard' rows ; returns a list of ShardInfo-s
+
+        'render' is as returned by compile_row_renderer() ( default history columns if None )
+    """
+
+    if render is None:
+        render, _thead = compile_row_renderer( HISTORY_COLUMNS, HISTORY_DEFAULT_COLUMNS )
+
+    base, ext = os.path.splitext( filename )
+
+    if shard == SHARD_MONTH:
+        keyed = ( ( row.last_visit.strftime('%Y-%m'), row ) for row in rows )
+    else:
+        keyed = ( ( '{:04d}'.format( n // shard + 1 ), row ) for n, row in enumerate(rows) )
+
+    shards = []
+    key_counts = {}
+
+    for key, group in groupby( keyed, key = itemgetter(0) ):
+
+        # an unordered stream may come back to a month seen before
+        key_counts[ key ] = key_counts.get( key, 0 ) + 1
+        if key_counts[ key ] > 1:
+            key = '{}.{}'.format( key, key_counts[ key ] )
+
+        shard_filename = '{}-{}{}'.format( base, key, ext )
+
+        # [ n_rows, earliest, latest ]
+        stats = [ 0, None, None ]
+
+        def _tracked( group ):
+            for _key, row in group:
+                stats[0] += 1
+                if stats[1] is None or row.last_visit < stats[1]:
+                    stats[1] = row.last_visit
+                if stats[2] is None or row.last_visit > stats[2]:
+                    stats[2] = row.last_visit
+                yield row
+
+        with open( shard_filename, 'w', encoding='utf8' ) as html_file:
+            html_file.write( html_header )
+            _write_rows( html_file, _tracked( group ), render )
+            html_file.write( HTML_FOOTER )
+
+        if _dbg:
+            print( "shard {0!r}: {1} rows".format( shard_filename, stats[0] ) )
+
+        shards.append( ShardInfo( shard_filename, *stats ) )
+
+    return shards
+
+
+def write_shard_index( filename, shards ):
+    """ an html page listing report shards with row counts and date ranges """
+
+    _fmt = "<tr><td><a href='{0}'>{0}</a></td><td>{1}</td><td>{2}</td><td>{3}</td></tr>\n"
+
+    with open( filename, 'w', encoding='utf8' ) as html_file:
+
+        html_file.write( HTML_SHARD_INDEX_HEADER )
+
+        for shard in shards:
+            html_file.write( _fmt.format( html.escape( os.path.basename( shard.filename ) )
+                                        , shard.n_rows
+                                        , shard.first.strftime( REPORT_DATE_FORMAT )
+                                        , shard.last.strftime( REPORT_DATE_FORMAT )
+                                        ) )
+
+        html_file.write( HTML_FOOTER )
+
+
+## def history(cursor, pattern=None, src=""):
+## def history(dbname, pattern=None, src=""):
+## def history(dbname, options, src="" ):
+## def history(dbnames, options, profiles={}, src="", _max_dbg_lines = 20 ):
+def history(dbnames, options, sql_filters, profiles={}, src="", _max_dbg_lines = 20 ):
+    ''' Function which extracts history from the sqlite file '''
+
+    # compiled once for the whole report
+    render, thead = compile_row_renderer( HISTORY_COLUMNS, options.columns or HISTORY_DEFAULT_COLUMNS )
+    html_header = _report_header( HTML_TEMPLATE_HISTORY, thead )
+
+    filename = _report_filename( options, 'history' )
+
+    rows = [] # nothing for unsupported sources
+    if src == 'firefox':
+
+        # '--history' loses an optional "pattern" argument --
+        #  -- use '--query' and '--filter' options instead
+
+        rows = iter_history( dbnames
+                           , query = options.query
+                           , filter = options.filter
+                           , dates = options.date_cond
+                           , sql_filters = sql_filters
+                           , profiles = profiles
+                           , dedupe = options.dedupe
+                           , regex = options.regex
+                           , connection = options.connection
+                           , jobs = options.jobs
+                           , _max_dbg_lines = _max_dbg_lines
+                           )
+
+        # each database comes ordered by itself ; a global order for several ones
+        # needs a sort, which spills to temporary files beyond the memory budget
+        sort_buffer = options.sort_buffer
+        if options.shard == SHARD_MONTH and sort_buffer is None:
+            # one file per month needs a time-ordered stream
+            sort_buffer = SORT_BUFFER_ROWS
+
+        if sort_buffer is not None and len(dbnames) > 1:
+            rows = external_sort( rows
+                                , key = attrgetter('last_visit')
+                                , reverse = True
+                                , buffer_rows = sort_buffer
+                                )
+
+
+    # turning off chrome 'branch' -- anyone interested feel free to reopen it and handle like FF code above )
+    if 0:
+        if src == 'chrome':
+            sql = "SELECT urls.url, urls.title, urls.visit_count, \
+            urls.typed_count, datetime(urls.last_visit_time/1000000-11644473600,'unixepoch','localtime'), urls.hidden,\
+            visits.visit_time, visits.from_visit, visits.transition FROM urls, visits\
+             WHERE  urls.id = visits.url and urls.title is not null order by last_visit_time desc "
+
+            execute_query(cursor, sql)
+            for row in cursor:
+                print("%s %s"%(row[0], row[4]))
+
+
+    if options.shard is None:
+
+        # rows are written as they come, so that the report size is not limited by memory
+        html_file = open( filename, 'w', encoding='utf8' )
+        html_file.write( html_header )
+
+        _write_rows( html_file, rows, render )
+
+        html_file.write( HTML_FOOTER )
+        html_file.close()
+
+    else:
+        # 'filename' becomes an index page for the shards
+        shards = write_history_shards( filename, html_header, rows, options.shard, render )
+        write_shard_index( filename, shards )
+
+    open_browser( filename )
+
+
+## def bookmarks(cursor, pattern=None):
+## def bookmarks(dbname, pattern=None, _max_dbg_lines = 20):
+def bookmarks(dbnames, options, profiles={}, _max_dbg_lines = 20):
+    ''' Function to extract bookmark related information '''
+
+    ## with open( HTML_TEMPLATE_BOOKMARKS, 'r') as t:
+    ##     html = t.read()
+    render, thead = compile_row_renderer( BOOKMARK_COLUMNS, options.columns or BOOKMARK_DEFAULT_COLUMNS )
+    html_header = _report_header( HTML_TEMPLATE_BOOKMARKS, thead )
+
+    filename = _report_filename( options, 'bookmarks' )
+
+    # TODO: handle possible encoding issues if bookmarks aren't in utf-8
+    #       ( could they be? what the docs say? )
+    #       // possibly use locale.getpreferredencoding()
+    #       // sys.getfilesystemencoding() could be a second guess, I suppose
+    html_file = open( filename, 'w', encoding='utf8' )
+    html_file.write( html_header )
+
+    rows = iter_bookmarks( dbnames
+                         , query = options.query
+                         , filter = options.filter
+                         , profiles = profiles
+                         , dedupe = options.dedupe
+                         , regex = options.regex
+                         , connection = options.connection
+                         , jobs = options.jobs
+                         , _max_dbg_lines = _max_dbg_lines
+                         )
+
+    _write_rows( html_file, rows, render )
+
+    html_file.write( HTML_FOOTER )
+    html_file.close()
+
+    open_browser( filename )
+
+
+class _OpenSession:
+    """ a session still accepting visits, see group_sessions() """
+
+    __slots__ = ( 'start', 'end', 'n_pages', 'link', 'title', 'matched', 'visit_ids' )
+
+    def __init__( self, start, link, title ):
+        self.start = start
+        self.end = start
+        self.n_pages = 0
+        self.link = link
+        self.title = title
+        self.matched = False
+        self.visit_ids = []
+
+
+def group_sessions( visits, gap, passes = None ):
+    """ a generator ; groups visits into browsing sessions in a single pass
+
+        args:
+         - visits -- ( visit_id, from_visit, visit_date, visit_type, link, title, ... ) tuples
+                     ordered by visit_date ( moz time, see convert_moz_time() )
+         - gap -- a session ends after that much inactivity ( in moz time units )
+         - passes -- an optional check( title, link ) ; sessions without
+                     a single passing page are dropped
+
+        a visit joins the session of its referrer ( from_visit ) if that one is still open ;
+        visits without one join the most recently active session, except for typed urls
+        and bookmarks, which start a new one -- so parallel browsing "threads" are kept apart
+
+        yields ( start, end, n_pages, link, title ) tuples as sessions end ;
+        memory is bounded by the open sessions ( and their visit ids )
+    """
+
+    open_sessions = []
+    last_active = None
+    by_visit = {} # visit id -> open session, to follow referrer chains
+
+    for visit_id, from_visit, visit_date, visit_type, link, title, *_rest in visits:
+
+        # close whatever has been idle for too long
+        if open_sessions and visit_date - open_sessions[0].end > gap:
+            still_open = []
+            for session in open_sessions:
+                if visit_date - session.end > gap:
+                    for _id in session.visit_ids:
+                        del by_visit[ _id ]
+                    if session.matched:
+                        yield ( session.start, session.end, session.n_pages, session.link, session.title )
+                else:
+                    still_open.append( session )
+            open_sessions = still_open
+
+        session = by_visit.get( from_visit )
+        if session is None and visit_type not in SESSION_START_VISIT_TYPES:
+            if last_active is not None and visit_date - last_active.end <= gap:
+                session = last_active
+
+        if session is None:
+            session = _OpenSession( visit_date, link, title )
+            open_sessions.append( session )
+
+        session.end = visit_date
+        session.n_pages += 1
+        session.visit_ids.append( visit_id )
+        by_visit[ visit_id ] = session
+
+        if not session.matched:
+            session.matched = ( passes is None ) or passes( title, link )
+
+        # keep open_sessions ordered by the last activity ( oldest first )
+        if open_sessions[-1] is not session:
+            open_sessions.remove( session )
+            open_sessions.append( session )
+        last_active = session
+
+    for session in sorted( open_sessions, key = attrgetter('start') ):
+        if session.matched:
+            yield ( session.start, session.end, session.n_pages, session.link, session.title )
+
+
+def _unseen_visits( visits, seen ):
+    """ a generator ; skips visits ( of sessions_query.sql ) already in 'seen',
+        identified by the place guid and the visit date ( see dedupe_key() ), and adds the rest
+    """
+
+    for visit in visits:
+
+        # older databases may lack guid-s, fall back to urls then
+        key = dedupe_key( visit[6] or visit[4], visit[2] )
+        if key in seen:
+            continue
+        seen.add( key )
+
+        yield visit
+
+
+def iter_sessions( dbnames
+                 , query = None
+                 , filter = None
+                 , dates = None
+                 , gap_minutes = SESSION_GAP_MINUTES
+                 , sql_filters = ()
+                 , profiles = {}
+                 , dedupe = False
+                 , regex = None
+                 , connection = CONNECTION_DEFAULT
+                 ):
+    """ a generator ; yields SessionRow-s reconstructed from visits, see group_sessions() ;
+        a session is shown if any of its pages passes '--query' / '--filter' / '--regex'
+        ( the other pages still count ), other arguments are as for iter_history() ;
+        with 'dedupe', visits already seen in an earlier database ( e.g. the live profile
+        for its backups ) are left out before grouping
+    """
+
+    seen = set() if dedupe else None
+
+    parsed_query, parsed_filter = _parse_filters( query, filter )
+
+    if regex is not None:
+        # fail early, and with a clear message, for a broken regex
+        re.compile( regex )
+
+    passes = None
+    if parsed_query or parsed_filter or regex is not None:
+        def passes( title, link ):
+            if regex is not None:
+                if not ( sqlite_regexp( regex, link ) or sqlite_regexp( regex, title ) ):
+                    return False
+            return _pass_filters( title = title
+                                , link = link
+                                , parsed_query = parsed_query
+                                , parsed_filter = parsed_filter
+                                )
+
+    start_date, end_date = ( None, None )
+    if dates is not None:
+        start_date, end_date = _parse_date_spec( dates )
+
+    ff_sql = build_sessions_sql( sql_filters, start_date, end_date )
+
+    gap = gap_minutes * 60 * 1000000
+
+    for dbname in dbnames:
+
+        profile_name = get_profile_name( dbname, profiles )
+
+        visits = run_query_wrapper( dbname, ff_sql, connection )
+        if seen is not None:
+            visits = _unseen_visits( visits, seen )
+
+        for start, end, n_pages, link, title in group_sessions( visits, gap, passes ):
+            yield SessionRow( convert_moz_time( start ), convert_moz_time( end )
+                            , n_pages, link, title or '', profile_name )
+
+
+def sessions(dbnames, options, sql_filters, profiles={}):
+    ''' a report of browsing sessions, see iter_sessions() '''
+
+    render, thead = compile_row_renderer( SESSION_COLUMNS, options.columns or SESSION_DEFAULT_COLUMNS )
+    html_header = _report_header( HTML_TEMPLATE_SESSIONS, thead )
+
+    filename = _report_filename( options, 'sessions' )
+
+    html_file = open( filename, 'w', encoding='utf8' )
+    html_file.write( html_header )
+
+    rows = iter_sessions( dbnames
+                        , query = options.query
+                        , filter = options.filter
+                        , dates = options.date_cond
+                        , gap_minutes = options.session_gap
+                        , sql_filters = sql_filters
+                        , profiles = profiles
+                        , dedupe = options.dedupe
+                        , regex = options.regex
+                        , connection = options.connection
+                        )
+
+    _write_rows( html_file, rows, render )
+
+    html_file.write( HTML_FOOTER )
+    html_file.close()
+
     open_browser( filename )
 
 
@@ -730,14 +1984,16 @@ def list_places(base_dir, filter_patterns = [], _default_filter = '*'):
 
         patterns.append(p)
 
-    dirs = os.listdir( base_dir )
-    
-    # apply all patterns, collect anything matching
-    for p in patterns:
-        filtered = fnmatch.filter( dirs, p )
+    # a single pass over the folder ; a folder matching several patterns
+    # is still checked ( and reported ) only once
+    with os.scandir( base_dir ) as entries:
+        for entry in entries:
 
-        for d in filtered:
-            testpath = os.path.join( base_dir, d, DBNAME )
+            p = next( ( p for p in patterns if fnmatch.fnmatch( entry.name, p ) ), None )
+            if p is None:
+                continue
+
+            testpath = os.path.join( entry.path, DBNAME )
             if os.path.exists( testpath ):
                 if _dbg:
                     _fmt = "found a matching profile: {0!r} /{1!r}/"
@@ -747,6 +2003,81 @@ def list_places(base_dir, filter_patterns = [], _default_filter = '*'):
     return found
 
 
+def _discover_home( home_dir, filter_patterns ):
+    """ ( places, profiles ) for a single home directory, see discover_places() """
+
+    firefox_path = home_dir + get_path('firefox')
+    if not os.path.isdir( firefox_path ):
+        return ( [], {} )
+
+    # else ...
+
+    # nb: the real folder name, so that e.g. a symlink alias does not relabel the user
+    user = os.path.basename( os.path.realpath( home_dir ).rstrip( os.sep ) )
+
+    try:
+        profiles = list_profiles( firefox_path )
+    except configparser.Error as error:
+        # the places are still there, only unnamed
+        print( "! {0!r}: {1}".format( firefox_path, error ), file=sys.stderr )
+        profiles = {}
+
+    profiles = { path: "{0}: {1}".format( user, name ) for path, name in profiles.items() }
+
+    places = list_places( firefox_path, filter_patterns = filter_patterns )
+
+    return ( places, profiles )
+
+
+def discover_places( home_patterns, filter_patterns = [], workers = DISCOVERY_WORKERS ):
+    """ find profiles in many home directories at once ( e.g. '/home/*' ) ;
+        returns ( places, profiles ) as list_places() and list_profiles() would,
+        with profile names prefixed by the user ( home folder ) name
+
+        args:
+         - home_patterns -- a list of home directories or glob patterns
+         - filter_patterns -- see list_places()
+         - workers -- homes scanned in parallel ( it's mostly waiting for the file system )
+    """
+
+    homes = []
+    seen_homes = set()
+    for pattern in home_patterns:
+        for home_dir in sorted( glob.glob( pattern ) ):
+            real = os.path.realpath( home_dir )
+            if real not in seen_homes and os.path.isdir( real ):
+                seen_homes.add( real )
+                homes.append( home_dir )
+
+    places = []
+    profiles = {}
+    seen_places = set()
+
+    with ThreadPoolExecutor( max_workers = workers ) as pool:
+
+        futures = [ pool.submit( _discover_home, home_dir, filter_patterns ) for home_dir in homes ]
+
+        # nb: in the order of homes, not of completion, to keep results stable
+        for home_dir, future in zip( homes, futures ):
+            try:
+                home_places, home_profiles = future.result()
+            except OSError as error:
+                # e.g. no permission to look into somebody's home, or a broken 'profiles.ini' --
+                # -- skip that home, not the whole scan
+                print( "! {0!r}: {1}".format( home_dir, error ), file=sys.stderr )
+                continue
+
+            profiles.update( home_profiles )
+
+            for path in home_places:
+                real = os.path.realpath( path )
+                if real not in seen_places:
+                    seen_places.add( real )
+                    places.append( path )
+
+    return ( places, profiles )
+
+
 def parse_query( query_expr ):
     """
          'http://* google OR https://* twitter' 
@@ -762,16 +2093,82 @@ def parse_query( query_expr ):
     for part in or_parts :
         tokens = part.split()
         # nb: we also convert them to lower-case (shall "just work" in Py3 ))
-        tokens = [ fnmatch_decorate(t.lower()) for t in tokens ]
+        ## tokens = [ fnmatch_decorate(t.lower()) for t in tokens ]
+        tokens = [ parse_query_token(t.lower()) for t in tokens ]
 
         result.append( tokens )
 
     return result
 
 
-def fnmatch_pass( text, parsed_query ):
+def parse_query_token( token ):
+    """
+         'host:Example.org.' => HostMatch( 'example.org', exact = False )
+         'site:example.org'  => HostMatch( 'example.org', exact = True )
+         'google'            => '*google*'
+    """
+
+    prefix, sep, host = token.partition(':')
+    if sep and prefix in ( 'host', 'site' ) and host.strip('.'):
+        return HostMatch( host.strip('.').lower(), prefix == 'site' )
+
+    # else ...
+    return fnmatch_decorate( token )
+
+
+def url_host( link, _last = [ ( None, '' ) ] ):
+    """ lower-cased host name of an url, '' if there is none ;
+        the last result is kept, as a row's link is looked at for both link and title matching
+    """
+
+    last_link, last_host = _last[0]
+    if link == last_link:
+        return last_host
+
+    # else ...
+    try:
+        host = urlsplit( link ).hostname or ''
+    except ValueError:
+        host = ''
+
+    # nb: a single ( atomic ) assignment, for threads
+    _last[0] = ( link, host )
+
+    return host
+
+
+def host_pass( host, host_match ):
+    """ check if a host name matches a HostMatch """
+
+    if host_match.exact:
+        return host == host_match.host
+
+    return host == host_match.host or host.endswith( '.' + host_match.host )
+
+
+def query_host_groups( parsed_query ):
+    """ host tokens of each OR group of a parse_query() result, or None unless
+        every group has some -- only then can the hosts limit a query as a whole
+    """
+
+    if not parsed_query:
+        return None
+
+    result = []
+    for or_group in parsed_query:
+        host_matches = [ t for t in or_group if isinstance( t, HostMatch ) ]
+        if not host_matches:
+            return None
+        result.append( host_matches )
+
+    return result
+
+
+def fnmatch_pass( text, parsed_query, link = None ):
     """
-        check if text matches any group of filters as defined by parse_query()
+        check if text matches any group of filters as defined by parse_query() ;
+        'host:' / 'site:' tokens are checked against the host of 'link' ( see url_host() ),
+        which is only parsed when there are such tokens
     """
 
     text = text.lower()
@@ -780,9 +2177,16 @@ def fnmatch_pass( text, parsed_query ):
     for or_group in parsed_query:
         passed = True # changing default ; "no filters" -> pass
         for expr in or_group :
-            if not fnmatch.fnmatch( text, expr ):
+            if isinstance( expr, HostMatch ):
+                matched = ( link is not None ) and host_pass( url_host( link ), expr )
+            else:
+                matched = fnmatch.fnmatch( text, expr )
+            if not matched:
                 passed = False
                 break
+        if passed:
+            # nb: a later group shall not override a match
+            break
         
     # at this stage, any "well-defined" (no empty clauses) query 
     # will match when and only when there's at least one group
@@ -814,8 +2218,18 @@ def parse_options():
                        , help = "list existing profiles and their paths" )
 
     # this will have priority compared to --profile-pattern ( as a more low-level thing ) )
-    parser.add_argument('--use-places', '--db', dest='places_sqlite', default = None
-                       , help="direct path to a 'places.sqlite' database ; takes priority when used along with '--profile-pattern'")
+    parser.add_argument('--use-places', '--db', dest='places_sqlite', action='append', default = []
+                       , help="direct path ( or a glob pattern ) to a 'places.sqlite' database ; can be repeated ; takes priority when used along with '--profile-pattern'")
+
+    parser.add_argument('--homes', dest='homes', action='append', default = []
+                       , help="look for profiles in these home directories instead of $HOME ; a glob pattern like '/home/*' ; can be repeated")
+    parser.add_argument('--workers', dest='workers', default = DISCOVERY_WORKERS, type=int
+                       , help="home directories scanned in parallel with '--homes' (default {})".format( DISCOVERY_WORKERS ) )
+
+    parser.add_argument('--connection', dest='connection', default = CONNECTION_DEFAULT, choices = ( CONNECTION_DEFAULT, CONNECTION_READ )
+                       , help="'{}' opens databases read-only, with mmap, a larger cache and in-memory temp storage".format( CONNECTION_READ ) )
+    parser.add_argument('--explain', dest='explain', action='store_true', default=False
+                       , help="print query plans ( flagging full table / index scans and temp b-tree sorts ) for the --history / --bookmarks / --sessions queries instead of running them")
 
 
     parser.add_argument('--output-file', '-o', dest='output_filename', default = None
@@ -827,12 +2241,50 @@ def parse_options():
     
 
     parser.add_argument('--query', '-q', dest='query', default = None
-                       , help="apply a filter to pass matching links/titles ; an example: 'http://* google OR https://* twitter' : OR splits groups, within each group all tokens are AND-ed")
+                       , help="apply a filter to pass matching links/titles ; an example: 'http://* google OR https://* twitter' : OR splits groups, within each group all tokens are AND-ed ; 'host:example.org' passes links to example.org and its subdomains, 'site:example.org' to that exact host ( both are index lookups if every group has one )")
     parser.add_argument('--filter', '-f', dest='filter', default = None
                        , help="apply a filter to drop matching links/titles ; basically it is a 'not --query ...' and is AND-ed with the --query filter, if any ")
+    parser.add_argument('--regex', '-r', dest='regex', default = None, type=_regex_spec
+                       , help="pass links/titles matching a ( case-insensitive, python ) regular expression ; evaluated inside sqlite and AND-ed with --query / --filter")
+
+    parser.add_argument('--dedupe', dest='dedupe', action='store_true', default=False
+                       , help="emit each place / bookmark only once when the same records come from several databases ( e.g. profile backups ) ; for --sessions, each visit")
+
+    _SORT_BUFFER_DEFAULT = SORT_BUFFER_ROWS
+    parser.add_argument('--global-order', '--sort-buffer', dest='sort_buffer', nargs='?', default=None, const=_SORT_BUFFER_DEFAULT, type=int
+                       , help = "order history of several databases by date as a whole, sorting up to SORT_BUFFER rows in memory and spilling the rest to temporary files (default {} if set)".format( _SORT_BUFFER_DEFAULT ) )
+
+    parser.add_argument('--sessions', dest='sessions', action='store_true', default=None
+                       , help="a report of browsing sessions ( visits grouped by inactivity gaps and referrers ) ; honors --dates, --query, --filter, --regex")
+    parser.add_argument('--session-gap', dest='session_gap', default = SESSION_GAP_MINUTES, type=float
+                       , help="minutes of inactivity that end a session (default {})".format( SESSION_GAP_MINUTES ) )
+
+    parser.add_argument('--columns', dest='columns', default = None, type=_columns_spec
+                       , help="comma-separated report columns, e.g. 'link,date,guid' ; history: {} ; bookmarks: {} ; sessions: {} ; '--fuzzy' adds 'score'".format(
+                                 ','.join( HISTORY_COLUMNS ), ','.join( BOOKMARK_COLUMNS ), ','.join( SESSION_COLUMNS ) ) )
+
+    parser.add_argument('--jobs', '-j', dest='jobs', default = None, type=int
+                       , help="filter history/bookmark rows on that many processes ( --query, --filter, --dates, --regex ) ; rows are fetched in batches of {} and keep their order".format( FILTER_BATCH_ROWS ) )
+
+    parser.add_argument('--shard', dest='shard', default = None, type=_shard_spec
+                       , help="split the history report into one file per '{}' or per SHARD rows, plus an index page at the usual location".format( SHARD_MONTH ) )
+
+    parser.add_argument('--fuzzy', '-z', dest='fuzzy', default = None
+                       , help="a typo-tolerant history search by title/url similarity ( uses a trigram index kept under {!r} )".format( CACHE_DIR ) )
+    parser.add_argument('--fuzzy-threshold', dest='fuzzy_threshold', default = FUZZY_THRESHOLD, type=float
+                       , help="minimal similarity for '--fuzzy', between 0 and 1 (default {})".format( FUZZY_THRESHOLD ) )
+    parser.add_argument('--fuzzy-limit', dest='fuzzy_limit', default = FUZZY_LIMIT, type=int
+                       , help="show that many best '--fuzzy' matches (default {})".format( FUZZY_LIMIT ) )
+    parser.add_argument('--fuzzy-resync', dest='fuzzy_resync', action='store_true', default=False
+                       , help="compare the whole '--fuzzy' index with the history first ( normally only done when places were removed ), e.g. to pick up retitled places")
 
     args = parser.parse_args()
 
+    # columns depend on the reports asked for ; fail before any of them is written
+    _msg = _check_columns( args )
+    if _msg is not None:
+        parser.error( _msg )
+
     return args
 
 
@@ -841,17 +2293,31 @@ def parse_options():
 
 if __name__ == "__main__":
 
+    # "dev mode" for the command line ; change this in production
+    _dbg = True
+    if _dbg:
+        # nb: not on import -- it would replace sys.excepthook of a host application
+        import cgitb
+        cgitb.enable(format='text')
+
     options = parse_options()
 
     # wrap imported filter fragments, if any, with sql 'like' globbing characters ('%')
     HISTORY_SQL_URL_FILTERS = [ sql_like_decorate(f) for f in HISTORY_SQL_URL_FILTERS ]
 
     try:
-        firefox_path = get_path('firefox')
-        home_dir = os.environ['HOME']
-        firefox_path = home_dir + firefox_path; print(firefox_path)
+        fleet_places = None # '--homes' only
+        if options.homes:
+            fleet_places, profile_dict = discover_places( options.homes
+                                                        , filter_patterns = options.profile_filters
+                                                        , workers = options.workers
+                                                        )
+        else:
+            firefox_path = get_path('firefox')
+            home_dir = os.environ['HOME']
+            firefox_path = home_dir + firefox_path; print(firefox_path)
 
-        profile_dict = list_profiles( firefox_path )
+            profile_dict = list_profiles( firefox_path )
 
         if options.list_profiles:
             _swapped = [ (n, p) for (p, n) in profile_dict.items() ]
@@ -862,18 +2328,22 @@ if __name__ == "__main__":
             sys.exit(0)
 
         sqlite_paths = [] # not set yet
-        if options.places_sqlite is not None:
-            if os.path.exists( options.places_sqlite ):
-                sqlite_paths = [ options.places_sqlite ]
+        for db_pattern in options.places_sqlite:
+            matched = sorted( glob.glob( db_pattern ) )
+            if matched:
+                sqlite_paths.extend( matched )
             else:
-                print( "--db: path {0!r} does not exist!".format( options.places_sqlite )
+                print( "--db: path {0!r} does not exist!".format( db_pattern )
                      , file=sys.stderr  
                      )
 
         # next try
         if not sqlite_paths :
         
-            places = list_places( firefox_path, filter_patterns=options.profile_filters )
+            if fleet_places is not None:
+                places = fleet_places
+            else:
+                places = list_places( firefox_path, filter_patterns=options.profile_filters )
             if not places:
                 print("no profile found") ; sys.exit(2)
 
@@ -906,6 +2376,10 @@ if __name__ == "__main__":
         else:
             raise
 
+    if options.explain:
+        explain( sqlite_paths, options = options, sql_filters = HISTORY_SQL_URL_FILTERS )
+        sys.exit(0)
+
     ## cursor = firefox_connection.cursor()
     #CHROME_CURSOR = chrome_connection.cursor()
 
@@ -928,6 +2402,16 @@ if __name__ == "__main__":
         #print("From chrome")
         #history(CHROME_CURSOR, src="chrome")
 
+    if options.fuzzy is not None:
+        fuzzy( sqlite_paths, options = options, profiles = profile_dict )
+
+    if options.sessions is not None:
+        sessions( sqlite_paths
+                , options = options
+                , sql_filters = HISTORY_SQL_URL_FILTERS
+                , profiles = profile_dict
+                )
+
     ## cursor.close()
     #CHROME_CURSOR.close()
 
@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+    asyncio access to the pyfox library api ( iter_history(), iter_bookmarks() etc. ),
+    e.g. for an aiohttp service :
+
+        places = AsyncPlaces()
+        ...
+        async for row in places.history( dbnames, query = 'python', limit = 100 ):
+            ...
+
+    The blocking query generators are advanced on a small, shared thread pool,
+    a batch of rows at a time ; the next batch is fetched only while the current
+    one is consumed ( backpressure ), so a slow client does not make rows pile up.
+    At most 'max_connections' queries have their databases open at once, the rest wait.
+
+    Cancelling a request ( or leaving 'async for' early ) closes the query generator,
+    which closes its sqlite connection and removes the temporary copy run_query()
+    makes of a locked database ; wrap the generator with contextlib.aclosing()
+    to have that done right at 'break' rather than whenever it is finalized.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from itertools import islice
+
+import pyfox
+
+# threads advancing query generators, for all the requests together
+ASYNC_WORKERS = 4
+# queries with open databases at a time
+ASYNC_CONNECTIONS = 8
+# rows handed over to the event loop at a time
+ASYNC_BATCH_ROWS = 500
+
+
+def _next_batch( rows, batch_rows ):
+    """ up to 'batch_rows' rows from a generator ; runs in a worker thread """
+
+    return list( islice( rows, batch_rows ) )
+
+
+class AsyncPlaces:
+    """ async generators over pyfox queries ; one instance is meant
+        to be shared by all the requests of a service
+    """
+
+    def __init__( self
+                , max_workers = ASYNC_WORKERS
+                , max_connections = ASYNC_CONNECTIONS
+                , batch_rows = ASYNC_BATCH_ROWS
+                ):
+
+        self.batch_rows = batch_rows
+
+        self._executor = ThreadPoolExecutor( max_workers = max_workers, thread_name_prefix = 'pyfox' )
+        self._connections = asyncio.Semaphore( max_connections )
+
+    def close( self ):
+        """ stop the worker threads ( after queries in progress ) """
+
+        self._executor.shutdown( wait = False )
+
+    async def __aenter__( self ):
+        return self
+
+    async def __aexit__( self, *exc_info ):
+        self.close()
+
+    async def batches( self, iter_func, *args, **kwargs ):
+        """ an async generator ; yields lists of rows of iter_func( *args, **kwargs ),
+            a blocking generator ( such as pyfox.iter_history ) -- which is only advanced
+            on the worker threads, and by one of them at a time
+        """
+
+        loop = asyncio.get_running_loop()
+
+        async with self._connections:
+
+            rows = iter_func( *args, **kwargs )
+
+            pending = self._executor.submit( _next_batch, rows, self.batch_rows )
+            try:
+                while True:
+                    batch = await asyncio.wrap_future( pending )
+                    if not batch:
+                        break
+
+                    # read one batch ahead while this one is consumed
+                    pending = self._executor.submit( _next_batch, rows, self.batch_rows )
+                    yield batch
+
+            finally:
+                # a generator can't be closed while a batch is being fetched from it ;
+                # nb: a cancelled future that hasn't started is done as well
+                if not pending.done():
+                    await asyncio.wait( [ asyncio.wrap_future( pending ) ] )
+
+                try:
+                    await loop.run_in_executor( self._executor, rows.close )
+                except RuntimeError:
+                    # the pool is shut down already ( e.g. an abandoned generator finalized late )
+                    rows.close()
+
+    async def rows( self, iter_func, *args, **kwargs ):
+        """ an async generator ; same as batches(), but yields rows one by one """
+
+        # closing batches() right away when this one is closed, rather than on finalization
+        async with aclosing( self.batches( iter_func, *args, **kwargs ) ) as batches:
+            async for batch in batches:
+                for row in batch:
+                    yield row
+
+    def history( self, dbnames, **kwargs ):
+        """ HistoryRow-s, see pyfox.iter_history() for the arguments """
+
+        return self.rows( pyfox.iter_history, dbnames, **kwargs )
+
+    def bookmarks( self, dbnames, **kwargs ):
+        """ BookmarkRow-s, see pyfox.iter_bookmarks() for the arguments """
+
+        return self.rows( pyfox.iter_bookmarks, dbnames, **kwargs )
+
+    def sessions( self, dbnames, **kwargs ):
+        """ SessionRow-s, see pyfox.iter_sessions() for the arguments """
+
+        return self.rows( pyfox.iter_sessions, dbnames, **kwargs )
+
+    def fuzzy( self, dbnames, text, **kwargs ):
+        """ FuzzyRow-s, see pyfox.iter_fuzzy() for the arguments """
+
+        return self.rows( pyfox.iter_fuzzy, dbnames, text, **kwargs )
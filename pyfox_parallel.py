@@ -0,0 +1,47 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+    Ordered, bounded fan-out of row batches to a process pool : batches are
+    submitted as they are fetched, results come back in submission order,
+    and only a few batches per worker are in flight at any time -- so that
+    a huge query is neither loaded into memory nor reordered.
+
+    Functions shall be picklable ( module-level ), and so shall be the batches.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# batches queued per worker process ; enough to keep workers busy
+# while the parent process fetches the next ones
+PENDING_PER_WORKER = 2
+
+
+def filter_pool( jobs, initializer = None, initargs = () ):
+    """ a ProcessPoolExecutor with 'jobs' workers, each set up by initializer( *initargs ) """
+
+    return ProcessPoolExecutor( max_workers = jobs, initializer = initializer, initargs = initargs )
+
+
+def ordered_map( pool, func, batches, max_pending ):
+    """ a generator ; yields func( batch ) for each of 'batches', in order,
+        with at most 'max_pending' batches submitted but not yet yielded ;
+        whatever is still pending is cancelled if the generator is closed early
+    """
+
+    pending = deque()
+
+    try:
+        for batch in batches:
+            pending.append( pool.submit( func, batch ) )
+
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+    finally:
+        for future in pending:
+            future.cancel()
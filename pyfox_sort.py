@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+    Bounded-memory ordering for large exports : rows are sorted in memory
+    up to a given budget, each sorted run is spilled to a temporary file,
+    and the runs are k-way merged back with heapq.merge() .
+
+    Rows shall be picklable ( plain tuples, named tuples etc. )
+"""
+
+import heapq
+import pickle
+import tempfile
+
+# rows kept in memory before a sorted run is spilled to disk
+SORT_BUFFER_ROWS = 500000
+
+# rows pickled together ; fewer, larger pickle.dump() calls are much faster
+_SPILL_BATCH = 1000
+
+
+def _spill_run( sorted_rows, tmpdir = None, _batch = _SPILL_BATCH ):
+    """ write an already sorted list to an anonymous temporary file,
+        return the file rewound to its start
+    """
+
+    run_file = tempfile.TemporaryFile( prefix = 'pyfox-sort', dir = tmpdir )
+
+    for i in range( 0, len(sorted_rows), _batch ):
+        pickle.dump( sorted_rows[ i : i + _batch ], run_file, pickle.HIGHEST_PROTOCOL )
+
+    run_file.seek(0)
+
+    return run_file
+
+
+def _read_run( run_file ):
+    """ a generator ; yields rows back from a _spill_run() file """
+
+    while True:
+        try:
+            batch = pickle.load( run_file )
+        except EOFError:
+            break
+
+        yield from batch
+
+
+def external_sort( rows
+                 , key = None
+                 , reverse = False
+                 , buffer_rows = SORT_BUFFER_ROWS
+                 , tmpdir = None
+                 ):
+    """ a generator ; yields 'rows' sorted by 'key' ( as sorted() would do,
+        including stability ), holding at most 'buffer_rows' rows in memory
+
+        args:
+         - rows -- any iterable
+         - key, reverse -- same as for sorted()
+         - buffer_rows -- in-memory budget, in rows
+         - tmpdir -- where to spill sorted runs ( tempfile.gettempdir() by default )
+    """
+
+    if buffer_rows is None or buffer_rows < 1:
+        buffer_rows = SORT_BUFFER_ROWS
+
+    run_files = []
+    buffer = []
+
+    try:
+        for row in rows:
+            buffer.append( row )
+
+            if len(buffer) >= buffer_rows:
+                buffer.sort( key = key, reverse = reverse )
+                run_files.append( _spill_run( buffer, tmpdir ) )
+                buffer = []
+
+        buffer.sort( key = key, reverse = reverse )
+
+        if not run_files:
+            # everything fits, no merging needed
+            yield from buffer
+            return
+
+        # else ...
+
+        # the last ( incomplete ) run stays in memory ;
+        # heapq.merge() prefers earlier iterables on ties, which keeps the sort stable
+        runs = [ _read_run(f) for f in run_files ] + [ buffer ]
+
+        yield from heapq.merge( *runs, key = key, reverse = reverse )
+
+    finally:
+        for f in run_files:
+            f.close()
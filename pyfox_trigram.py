@@ -0,0 +1,283 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+    A trigram index for fuzzy ( typo-tolerant ) title/url search.
+
+    The index is a small sqlite database of its own, one per 'places.sqlite' ;
+    it is updated incrementally from places rows ( see TrigramIndex.update() ),
+    and places gone from the history are dropped ( see TrigramIndex.sync() ).
+
+    Similarity is pg_trgm's "word similarity" : the share of query trigrams
+    found in a document. Only documents that contain at least one of
+    the rarest query trigrams are looked at -- if a document shares
+    at least 'threshold' of the query trigrams, it must have one of
+    the ( n - n * threshold + 1 ) rarest ones.
+"""
+
+import heapq
+import math
+import re
+import sqlite3
+from collections import Counter
+from itertools import islice
+
+# words are indexed, punctuation is not ; url schemes are dropped as they are everywhere
+RE_WORD   = re.compile(r'\w+')
+RE_SCHEME = re.compile(r'^[a-z][a-z0-9+.-]*://', re.IGNORECASE)
+
+# variables per statement are limited ( 999 for older sqlite versions )
+_MAX_SQL_VARS = 500
+
+# places indexed per bulk insert ; their trigrams are sorted before going into the b-tree
+_UPDATE_CHUNK = 10000
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS docs
+        ( place_id INTEGER PRIMARY KEY
+        , guid TEXT
+        , url TEXT
+        , title TEXT
+        , last_visit_date INTEGER
+        ) ;
+    CREATE TABLE IF NOT EXISTS trigrams
+        ( tri TEXT
+        , place_id INTEGER
+        , PRIMARY KEY ( tri, place_id )
+        ) WITHOUT ROWID ;
+    CREATE TABLE IF NOT EXISTS tri_df
+        ( tri TEXT PRIMARY KEY
+        , df INTEGER
+        ) WITHOUT ROWID ;
+    CREATE TABLE IF NOT EXISTS meta
+        ( key TEXT PRIMARY KEY
+        , value INTEGER
+        ) ;
+"""
+
+
+def trigrams( text ):
+    """ a set of trigrams for lower-cased words, each padded
+        with two spaces in front and one after ( as pg_trgm does )
+
+         'Go' -> { '  g', ' go', 'go ' }
+    """
+
+    result = set()
+    for word in RE_WORD.findall( text.lower() ):
+        padded = '  ' + word + ' '
+        for i in range( len(padded) - 2 ):
+            result.add( padded[ i : i + 3 ] )
+
+    return result
+
+
+def doc_text( url, title ):
+    """ what gets indexed for a place """
+
+    url = RE_SCHEME.sub( '', url or '' )
+
+    return ( title or '' ) + ' ' + url
+
+
+class TrigramIndex:
+    """ a trigram index file ; see the module docstring """
+
+    def __init__( self, index_path ):
+
+        self.index_path = index_path
+
+        self.conn = sqlite3.connect( index_path )
+        # a cache, which can always be rebuilt -- durability is not worth the fsync-s
+        self.conn.execute( "PRAGMA synchronous = OFF" )
+        self.conn.executescript( SCHEMA )
+
+    def close( self ):
+        self.conn.close()
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, *exc_info ):
+        self.close()
+
+    def _meta( self ):
+        return dict( self.conn.execute( "SELECT key, value FROM meta" ) )
+
+    def _set_meta( self, **values ):
+        self.conn.executemany( "INSERT OR REPLACE INTO meta VALUES ( ?, ? )", values.items() )
+
+    def high_water( self ):
+        """ ( max place id, max last visit date ) indexed so far ;
+            anything above either of them is new or changed
+        """
+
+        values = self._meta()
+
+        return ( values.get( 'max_place_id', 0 ), values.get( 'max_last_visit', 0 ) )
+
+    def synced_signature( self ):
+        """ what set_synced_signature() saved after the last sync(), or None """
+
+        values = self._meta()
+        if 'synced_count' not in values:
+            return None
+
+        return ( values['synced_count'], values['synced_max_id'] )
+
+    def set_synced_signature( self, signature ):
+        """ keep a cheap ( row count, max id ) summary of the places table, see synced_signature() """
+
+        with self.conn:
+            self._set_meta( synced_count = signature[0], synced_max_id = signature[1] )
+
+    def _apply_df( self, df_delta ):
+        """ add a Counter of document frequency changes to tri_df """
+
+        self.conn.executemany( "INSERT INTO tri_df VALUES ( ?, ? )"
+                               " ON CONFLICT ( tri ) DO UPDATE SET df = df + excluded.df"
+                             , ( item for item in df_delta.items() if item[1] != 0 )
+                             )
+        self.conn.execute( "DELETE FROM tri_df WHERE df <= 0" )
+
+    def _drop_trigrams( self, place_id, df_delta ):
+        """ remove the trigrams of an indexed place, if any, counting them off in 'df_delta' """
+
+        old = self.conn.execute( "SELECT url, title FROM docs WHERE place_id = ?"
+                               , ( place_id, ) ).fetchone()
+        if old is None:
+            return
+
+        # else ...
+        old_tris = trigrams( doc_text( *old ) )
+        self.conn.executemany( "DELETE FROM trigrams WHERE tri = ? AND place_id = ?"
+                             , ( ( t, place_id ) for t in old_tris ) )
+        df_delta.subtract( old_tris )
+
+    def update( self, rows ):
+        """ (re)index places rows : ( place_id, guid, url, title, last_visit_date ) ;
+            returns the number of rows indexed
+
+            rows go in chunks : docs and ( sorted ) trigrams with a few executemany() calls,
+            document frequencies once at the end ; an empty index skips looking for old trigrams
+        """
+
+        max_id, max_visit = self.high_water()
+        n_rows = 0
+
+        with self.conn:
+
+            is_empty = self.conn.execute( "SELECT 1 FROM docs LIMIT 1" ).fetchone() is None
+            df_delta = Counter()
+
+            rows = iter( rows )
+            while True:
+                chunk = list( islice( rows, _UPDATE_CHUNK ) )
+                if not chunk:
+                    break
+
+                pairs = []
+                for place_id, guid, url, title, last_visit_date in chunk:
+
+                    # a place seen before ( e.g. revisited ) -- drop its old trigrams
+                    if not is_empty:
+                        self._drop_trigrams( place_id, df_delta )
+
+                    tris = trigrams( doc_text( url, title ) )
+                    pairs.extend( ( t, place_id ) for t in tris )
+                    df_delta.update( tris )
+
+                    max_id = max( max_id, place_id )
+                    max_visit = max( max_visit, last_visit_date or 0 )
+
+                self.conn.executemany( "INSERT OR REPLACE INTO docs VALUES ( ?, ?, ?, ?, ? )", chunk )
+                pairs.sort()
+                self.conn.executemany( "INSERT OR IGNORE INTO trigrams VALUES ( ?, ? )", pairs )
+
+                n_rows += len( chunk )
+
+            self._apply_df( df_delta )
+            self._set_meta( max_place_id = max_id, max_last_visit = max_visit )
+
+        return n_rows
+
+    def sync( self, live_rows ):
+        """ compare the index with ( place_id, title ) rows of all the places that
+            shall be indexed now : documents of places that are gone ( e.g. cleared
+            from the history ) are removed ; returns place ids with a changed title,
+            which are up to the caller to update()
+        """
+
+        with self.conn:
+
+            self.conn.execute( "CREATE TEMP TABLE IF NOT EXISTS live ( place_id INTEGER PRIMARY KEY, title TEXT )" )
+            self.conn.execute( "DELETE FROM live" )
+            self.conn.executemany( "INSERT OR REPLACE INTO live VALUES ( ?, ? )", live_rows )
+
+            gone = [ place_id for ( place_id, ) in self.conn.execute(
+                        "SELECT place_id FROM docs WHERE place_id NOT IN ( SELECT place_id FROM live )" ) ]
+            df_delta = Counter()
+            for place_id in gone:
+                self._drop_trigrams( place_id, df_delta )
+                self.conn.execute( "DELETE FROM docs WHERE place_id = ?", ( place_id, ) )
+            self._apply_df( df_delta )
+
+            changed = [ place_id for ( place_id, ) in self.conn.execute(
+                        "SELECT l.place_id FROM live l JOIN docs d ON d.place_id = l.place_id"
+                        " WHERE d.title IS NOT l.title" ) ]
+
+            self.conn.execute( "DELETE FROM live" )
+
+        return changed
+
+    def _doc_freqs( self, tris ):
+        """ { trigram: document frequency } for the given trigrams """
+
+        result = dict.fromkeys( tris, 0 )
+
+        tris = list( tris )
+        for i in range( 0, len(tris), _MAX_SQL_VARS ):
+            chunk = tris[ i : i + _MAX_SQL_VARS ]
+            _sql = "SELECT tri, df FROM tri_df WHERE tri IN ({})".format( ','.join( '?' * len(chunk) ) )
+            result.update( self.conn.execute( _sql, chunk ) )
+
+        return result
+
+    def search( self, text, threshold = 0.5, limit = 100 ):
+        """ returns up to 'limit' best matches as a list of
+            ( score, url, title, last_visit_date, guid ) tuples, best first ;
+            score is within ( 0, 1 ], only scores >= threshold are returned
+        """
+
+        query_tris = trigrams( text )
+        n_query = len( query_tris )
+        if n_query == 0:
+            return []
+
+        # else ...
+
+        min_shared = max( 1, math.ceil( threshold * n_query ) )
+
+        # a document sharing 'min_shared' trigrams must contain
+        # at least one of any ( n_query - min_shared + 1 ) query trigrams --
+        # -- let them be the rarest ones, to keep the candidate lists short
+        doc_freqs = self._doc_freqs( query_tris )
+        rarest = sorted( query_tris, key = doc_freqs.get )[ : n_query - min_shared + 1 ]
+        rarest = [ t for t in rarest if doc_freqs[t] > 0 ]
+        if not rarest:
+            return []
+
+        _sql = ( "SELECT DISTINCT d.place_id, d.url, d.title, d.last_visit_date, d.guid"
+                 " FROM trigrams t JOIN docs d ON d.place_id = t.place_id"
+                 " WHERE t.tri IN ({})" ).format( ','.join( '?' * len(rarest) ) )
+
+        def _scored():
+            for place_id, url, title, last_visit_date, guid in self.conn.execute( _sql, rarest ):
+                shared = len( query_tris & trigrams( doc_text( url, title ) ) )
+                if shared >= min_shared:
+                    yield ( shared / n_query, last_visit_date or 0, url, title, guid )
+
+        best = heapq.nlargest( limit, _scored() )
+
+        return [ ( score, url, title, last_visit_date, guid )
+                 for ( score, last_visit_date, url, title, guid ) in best ]
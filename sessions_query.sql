@@ -0,0 +1,8 @@
+/* page visits, for session reconstruction ( see sessions() in 'pyfox.py' ) */
+SELECT v.id, v.from_visit, v.visit_date, v.visit_type, p.url, p.title, p.guid
+    FROM moz_historyvisits v
+    JOIN moz_places p ON p.id = v.place_id
+    WHERE p.url LIKE 'http%'
+        /* not page views : embedded (4), framed links (8) and reloads (9) */
+        AND v.visit_type NOT IN ( 4, 8, 9 ) ;
+        /* url filters, dates and "ORDER BY v.visit_date" are appended in 'pyfox.py' */